@@ -15,6 +15,11 @@ app.conf.beat_schedule = {
         'task': 'portal.tasks.weekly_digest',
         'schedule': crontab(hour=8, minute=0, day_of_week=1),  # Понедельник
     },
+    # перенос буферизованных голосов в базу (при VOTES_BUFFERED)
+    'flush_vote_buffer': {
+        'task': 'portal.tasks.flush_vote_buffer',
+        'schedule': 10.0,  # Каждые 10 секунд
+    },
     'cleanup_jobs': {
         'task': 'portal.tasks.delete_old_job_executions',
         'schedule': crontab(hour=0, minute=0),  # Ежедневно в полночь
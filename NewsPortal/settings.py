@@ -1,6 +1,7 @@
 from pathlib import Path
 import os
 import logging
+from django.core.exceptions import ImproperlyConfigured
 from django.utils.log import DEFAULT_LOGGING
 from django.utils.translation import gettext_lazy as _
 from dotenv import load_dotenv
@@ -76,24 +77,25 @@ SOCIALACCOUNT_EMAIL_VERIFICATION = 'none'
 SOCIALACCOUNT_LOGIN_ON_GET = False
 
 MIDDLEWARE = [
+    'portal.middlewares.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.locale.LocaleMiddleware',
-    'portal.middlewares.ForceLangMiddleware',
+    # Язык (префикс URL, cookie) и часовой пояс (cookie) без обращения к сессии у анонимов
+    'portal.middlewares.LocaleTimezoneMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'portal.middlewares.TimezoneMiddleware',
 ]
 
 ROOT_URLCONF = 'NewsPortal.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендера для PerformanceMiddleware
+        'BACKEND': 'portal.metrics.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -192,6 +194,13 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 
+# Рассылка уведомлений о новостях: подписчиков на одну задачу и через сколько
+# писем прогресс пачки сохраняется в кэш (при ошибке он сохраняется сразу)
+NOTIFICATION_CHUNK_SIZE = 500
+NOTIFICATION_SEND_BATCH = 50
+# Еженедельный дайджест: писем на одну отправку
+DIGEST_SEND_BATCH = 100
+
 SERVER_EMAIL = 'ваша почта с которой отправляется рассылка'
 
 SOCIALACCOUNT_PROVIDERS = {
@@ -322,7 +331,8 @@ LOGGING = {
     'loggers': {
         'django': {
             'handlers': ['console', 'console_warning', 'console_error', 'file_general'],
-            'level': 'DEBUG',
+            # DEBUG стоил времени на каждом запросе; производительность — в PerformanceMiddleware
+            'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO'),
             'propagate': True,
         },
         'django.template': {
@@ -357,14 +367,99 @@ LOGGING = {
     }
 }
 
-# Настройки кэширования с файловой системой
+# Двухуровневый кэш (portal/cache_backends.py): LRU в памяти процесса перед общим
+# уровнем в Redis из CACHE_REDIS_URL. Счётчики (лимиты публикаций и комментариев,
+# буфер голосов, версия индекса поиска) — в том же Redis, общие для всех процессов.
+# Без Redis сайт запускается только с DEBUG, одним процессом runserver: файловый кэш
+# в cache_files/ и счётчики в памяти процесса
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+if not CACHE_REDIS_URL and not DEBUG:
+    raise ImproperlyConfigured('Без DEBUG нужен CACHE_REDIS_URL: счётчики кэша должны быть общими для процессов')
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': BASE_DIR / 'cache_files',
+        'BACKEND': 'portal.cache_backends.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': CACHE_REDIS_URL,
+            } if CACHE_REDIS_URL else {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': BASE_DIR / 'cache_files',
+            },
+            # add/incr/decr счётчиков должны быть атомарными, у файлового кэша это чтение + запись.
+            # Без Redis (только DEBUG) счётчики — в памяти единственного процесса
+            'COUNTERS': None if CACHE_REDIS_URL else {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'counters',
+                # Журнал буфера голосов — по ключу на голос; locmem по умолчанию держит 300 ключей
+                'OPTIONS': {'MAX_ENTRIES': 100000},
+            },
+            'LOCAL_MAX_ENTRIES': 2000,
+            'LOCAL_MAX_BYTES': 32 * 1024 * 1024,
+            'LOCAL_TIMEOUT': 5,
+            'STAMP_CHECK_INTERVAL': 1,
+            # Счётчики и служебные ключи — в COUNTERS, без локального LRU
+            'EXCLUDE': ['vote_buffer', 'news_quota', 'notify_progress', 'rate_limit', 'search_index'],
+            # Ключи страниц уже содержат версии тегов
+            'IMMUTABLE': ['page'],
+        },
     }
 }
 
+# Запрещённые слова для цензуры (portal/censor.py)
+CENSOR_BANNED_WORDS = ['редиска']
+
+# Поиск новостей (portal/search.py): по умолчанию FTS5 на SQLite, иначе индекс в памяти.
+# Можно явно указать бэкенд, например 'portal.search.PythonIndexBackend'.
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND') or None
+SEARCH_PAGE_SIZE = 10
+
+# Буферизация голосов (like/dislike) в кэше с переносом в базу задачей flush_vote_buffer
+VOTES_BUFFERED = os.getenv('VOTES_BUFFERED', 'False') == 'True'
+if VOTES_BUFFERED and not CACHE_REDIS_URL:
+    # Буфер пишут процессы сайта, а переносит в базу воркер Celery — счётчики нужны общие
+    raise ImproperlyConfigured('VOTES_BUFFERED требует CACHE_REDIS_URL')
+
+# Время жизни страниц в кэше; инвалидация — по тегам (portal/caching.py)
+PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Списки админки без фильтров: для таблиц больше этого числа строк
+# вместо COUNT(*) берётся оценка из статистики базы (portal.pagination.EstimatedCountPaginator)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Ленты RSS / Atom / JSON Feed (portal/feeds.py): число постов, размер пачки
+# чтения из базы и время жизни отрендеренной ленты (ключ включает версии тегов)
+FEED_ITEMS = 50
+FEED_CHUNK_SIZE = 20
+FEED_CACHE_TIMEOUT = 60 * 60
+
+# Лимит новостей автора в сутки (portal/quota.py); счётчик в кэше
+# пересевается из базы не реже, чем раз в NEWS_QUOTA_SYNC_TIMEOUT секунд
+NEWS_DAILY_LIMIT = 3
+NEWS_QUOTA_SYNC_TIMEOUT = 60 * 10
+
+# Машинный перевод постов (portal/translator.py): бэкенд, предложений в одном
+# запросе к сервису, параллельных запросов, постов в одной пачке сохранения.
+# TRANSLATE_ON_PUBLISH — переводить новый пост задачей Celery сразу после публикации
+# (по умолчанию выключено: тексты уходят во внешний сервис перевода)
+TRANSLATION_BACKEND = os.getenv('TRANSLATION_BACKEND', 'portal.translator.GoogleTranslateBackend')
+TRANSLATION_BATCH_SIZE = 20
+TRANSLATION_WORKERS = 4
+TRANSLATION_CHUNK_SIZE = 200
+TRANSLATE_ON_PUBLISH = os.getenv('TRANSLATE_ON_PUBLISH', 'False') == 'True'
+
+# Комментарии: не больше COMMENT_RATE_LIMIT от пользователя за COMMENT_RATE_PERIOD
+# секунд (portal/ratelimit.py), COMMENTS_PAGE_SIZE на страницу (курсорная пагинация)
+COMMENT_RATE_LIMIT = 5
+COMMENT_RATE_PERIOD = 60
+COMMENTS_PAGE_SIZE = 20
+
+# Server-Timing и гистограммы по маршрутам (portal.middlewares.PerformanceMiddleware);
+# /metrics/ в формате Prometheus отдаётся только с заголовком «Authorization: Bearer <METRICS_TOKEN>»;
+# без METRICS_TOKEN адрес выключен (за обратным прокси REMOTE_ADDR у всех запросов один)
+PERFORMANCE_METRICS = os.getenv('PERFORMANCE_METRICS', 'True') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
 print(f"Logs directory: {logs_dir}")
 
 LANGUAGES = [
@@ -387,6 +482,10 @@ LANGUAGE_COOKIE_SECURE = False
 LANGUAGE_COOKIE_HTTPONLY = False
 LANGUAGE_COOKIE_SAMESITE = 'Lax'
 
+# Часовой пояс посетителя (portal.middlewares.LocaleTimezoneMiddleware, set_timezone)
+TIMEZONE_COOKIE_NAME = 'django_timezone'
+TIMEZONE_COOKIE_AGE = 31536000  # 1 год в секундах
+
 MODELTRANSLATION_DEFAULT_LANGUAGE = 'ru'
 MODELTRANSLATION_LANGUAGES = ('ru', 'en')
 MODELTRANSLATION_FALLBACK_LANGUAGES = ('ru', 'en')
@@ -403,3 +502,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10
 }
+
+# Курсорная пагинация (created_at, id) для списков новостей/статей и API.
+# Без неё курсорный режим включается только параметром ?cursor= в запросе.
+POSTS_CURSOR_PAGINATION = os.getenv('POSTS_CURSOR_PAGINATION', 'False') == 'True'
@@ -25,6 +25,7 @@ from allauth.socialaccount.providers.yandex.views import YandexAuth2Adapter
 from allauth.socialaccount.providers.google.views import oauth2_login as google_login
 from allauth.socialaccount.providers.yandex.views import oauth2_login as yandex_login
 from django.views.i18n import set_language
+from portal.views import metrics
 
 handler403 = 'portal.views.custom_permission_denied'
 
@@ -41,6 +42,7 @@ urlpatterns = [
     path('accounts/yandex/login/', yandex_login, name='yandex_login'),
     path('i18n/setlang/', set_language, name='set_language'),
     path('i18n/', include('django.conf.urls.i18n')),
+    path('metrics/', metrics, name='metrics'),  # Метрики Prometheus (PerformanceMiddleware)
 ]
 
 
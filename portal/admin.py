@@ -1,7 +1,15 @@
 from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Prefetch
 from .models import Author, Category, Post, PostCategory, Comment, Subscription
+from . import votes
+from .pagination import EstimatedCountPaginator
 from modeltranslation.admin import TranslationAdmin
 
+# Сколько подписчиков показывать в списке категорий
+SUBSCRIBERS_PREVIEW = 5
+
 # Действие для обнуления рейтинга автора
 def reset_author_rating(modeladmin, request, queryset):
     queryset.update(rating=0)
@@ -9,30 +17,87 @@ reset_author_rating.short_description = 'Обнулить рейтинг авт
 
 # Действие для обнуления рейтинга поста
 def reset_post_rating(modeladmin, request, queryset):
-    queryset.update(rating=0)
+    with transaction.atomic():
+        # update() идёт мимо сигналов — вклад в рейтинги авторов снимается явно
+        votes.withdraw(Post, queryset)
+        queryset.update(rating=0)
 reset_post_rating.short_description = 'Обнулить рейтинг постов'
 
 # Действие для обнуления рейтинга комментария
 def reset_comment_rating(modeladmin, request, queryset):
-    queryset.update(rating=0)
+    with transaction.atomic():
+        # update() идёт мимо сигналов — вклад в рейтинги авторов снимается явно
+        votes.withdraw(Comment, queryset)
+        queryset.update(rating=0)
 reset_comment_rating.short_description = 'Обнулить рейтинг комментариев'
 
-# Действие для удаления всех подписчиков категории
+# Действие для удаления всех подписчиков категории — одним DELETE по таблице подписок
 def remove_category_subscribers(modeladmin, request, queryset):
-    for category in queryset:
-        category.subscribers.clear()
+    deleted, _ = Category.subscribers.through.objects.filter(category__in=queryset).delete()
+    modeladmin.message_user(request, f'Удалено подписок: {deleted}')
 remove_category_subscribers.short_description = 'Удалить всех подписчиков категории'
 
+class InputFilter(admin.SimpleListFilter):
+    """
+    Фильтр-поле ввода вместо списка всех значений: для авторов, пользователей
+    и постов список в боковой панели — это запрос на всю таблицу.
+    """
+    template = 'admin/input_filter.html'
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        # Остальные параметры списка уходят вместе с формой скрытыми полями
+        yield {
+            'params': [
+                (key, value) for key, value in changelist.params.items() if key != self.parameter_name
+            ],
+            'reset_query_string': changelist.get_query_string(remove=[self.parameter_name]),
+        }
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        return queryset.filter(**{self.lookup: value})
+
+class AuthorUsernameFilter(InputFilter):
+    title = 'автору (логин)'
+    parameter_name = 'author_username'
+    lookup = 'author__user__username'
+
+class UserUsernameFilter(InputFilter):
+    title = 'пользователю (логин)'
+    parameter_name = 'username'
+    lookup = 'user__username'
+
+class PostIdFilter(InputFilter):
+    title = 'посту (id)'
+    parameter_name = 'post_id'
+    lookup = 'post_id'
+
+    def queryset(self, request, queryset):
+        if self.value() and not self.value().strip().isdigit():
+            return queryset.none()
+        return super().queryset(request, queryset)
+
 # Inline для PostCategory
 class PostCategoryInline(admin.TabularInline):
     model = PostCategory
     extra = 1
+    autocomplete_fields = ('category',)
     verbose_name = "Категория"
     verbose_name_plural = "Категории"
 
 @admin.register(Author)
 class AuthorAdmin(admin.ModelAdmin):
     list_display = ('user', 'rating')
+    list_select_related = ('user',)
     list_filter = ('rating',)
     search_fields = ('user__username', 'user__email')
     actions = [reset_author_rating]
@@ -40,27 +105,49 @@ class AuthorAdmin(admin.ModelAdmin):
 @admin.register(Category)
 class CategoryAdmin(TranslationAdmin):
     list_display = ('name', 'display_subscribers', 'subscribers_count')
-    list_filter = ('name',)
     search_fields = ('name',)
     actions = [remove_category_subscribers]
     verbose_name_plural = 'Categories'
 
+    def get_queryset(self, request):
+        # Число подписчиков — агрегатом, первые SUBSCRIBERS_PREVIEW — одним запросом на страницу
+        return super().get_queryset(request).annotate(
+            subscribers_total=Count('subscribers', distinct=True),
+        ).prefetch_related(Prefetch(
+            'subscribers',
+            queryset=User.objects.only('id', 'username').order_by('username')[:SUBSCRIBERS_PREVIEW],
+            to_attr='subscribers_preview',
+        ))
+
     def display_subscribers(self, obj):
-        return ", ".join([user.username for user in obj.subscribers.all()])
+        names = ", ".join(user.username for user in obj.subscribers_preview)
+        rest = obj.subscribers_total - len(obj.subscribers_preview)
+        return f'{names} и ещё {rest}' if rest > 0 else names
     display_subscribers.short_description = 'Подписчики'
 
     def subscribers_count(self, obj):
-        return obj.subscribers.count()
+        return obj.subscribers_total
     subscribers_count.short_description = 'Количество подписчиков'
+    subscribers_count.admin_order_field = 'subscribers_total'
 
 @admin.register(Post)
 class PostAdmin(TranslationAdmin):
     inlines = [PostCategoryInline]
     list_display = ('title', 'post_type', 'author', 'created_at', 'rating', 'display_categories')
-    list_filter = ('post_type', 'author', 'created_at', 'categories')  # Возвращаем стандартный фильтр
+    list_select_related = ('author__user',)
+    list_filter = ('post_type', AuthorUsernameFilter, 'created_at', 'categories')
     search_fields = ('title', 'content', 'author__user__username')
+    autocomplete_fields = ('author',)
     filter_horizontal = ('categories',)
     actions = [reset_post_rating]
+    paginator = EstimatedCountPaginator
+    # Без второго COUNT(*) по всей таблице при активном фильтре
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('categories', queryset=Category.objects.only('id', 'name'))
+        )
 
     def display_categories(self, obj):
         return ", ".join([category.name for category in obj.categories.all()])
@@ -69,14 +156,22 @@ class PostAdmin(TranslationAdmin):
 @admin.register(PostCategory)
 class PostCategoryAdmin(admin.ModelAdmin):
     list_display = ('post', 'category')
+    list_select_related = ('post', 'category')
     list_filter = ('category',)
     search_fields = ('post__title', 'category__name')
+    autocomplete_fields = ('post', 'category')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('post', 'user', 'created_at', 'rating', 'text_preview')
-    list_filter = ('post', 'user', 'created_at')
+    list_select_related = ('post', 'user')
+    list_filter = (PostIdFilter, UserUsernameFilter, 'created_at')
     search_fields = ('text', 'user__username', 'post__title')
+    autocomplete_fields = ('post', 'user')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     actions = [reset_comment_rating]
 
     def text_preview(self, obj):
@@ -86,5 +181,7 @@ class CommentAdmin(admin.ModelAdmin):
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('user', 'category', 'created_at')
+    list_select_related = ('user', 'category')
     list_filter = ('category', 'created_at')
-    search_fields = ('user__username', 'category__name')
\ No newline at end of file
+    search_fields = ('user__username', 'category__name')
+    autocomplete_fields = ('user', 'category')
\ No newline at end of file
@@ -0,0 +1,366 @@
+import heapq
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .metrics import label_value, record_cache
+
+STAMP_KEY_PREFIX = '_two_tier_stamp:'
+
+# Бэкенды с атомарными add/incr/decr; у остальных (файловый, база) это чтение + запись,
+# и параллельные incr теряют обновления
+ATOMIC_BACKENDS = frozenset((
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+))
+
+# Локальные уровни процесса по LOCATION: экземпляры бэкенда создаются на каждый поток,
+# а LRU должен быть общим для всех потоков процесса
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class LocalTier:
+    """
+    LRU в памяти процесса, ограниченный числом записей, объёмом и временем жизни.
+    Запись действительна, пока штамп её пространства имён не изменился.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # ключ -> [pickle, истекает, пространство, штамп, попадания]
+        self.size = 0
+        # Штампы пространств имён, известные процессу, и время их последней проверки
+        self.stamps = {}
+        self.stamps_checked = 0.0
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            blob, expires, namespace, stamp, _ = entry
+            if expires < time.monotonic() or self.stamps.get(namespace) != stamp:
+                self._pop(key)
+                return None
+            entry[4] += 1
+            self.entries.move_to_end(key)
+            self.stats['local_hits'] += 1
+            return blob
+
+    def put(self, key, blob, namespace, stamp, ttl):
+        if stamp is None or len(blob) > self.max_bytes:
+            return
+        with self.lock:
+            self._pop(key)
+            self.entries[key] = [blob, time.monotonic() + ttl, namespace, stamp, 0]
+            self.size += len(blob)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._pop(next(iter(self.entries)))
+                self.stats['evictions'] += 1
+
+    def discard(self, key):
+        with self.lock:
+            self._pop(key)
+
+    def _pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.stamps.clear()
+
+    def count(self, stat, value=1):
+        with self.lock:
+            self.stats[stat] += value
+
+    def snapshot(self, hot_keys=10):
+        with self.lock:
+            stats = dict(self.stats, entries=len(self.entries), bytes=self.size)
+            hot = heapq.nlargest(hot_keys, self.entries.items(), key=lambda item: item[1][4])
+            stats['hot_keys'] = [(key, entry[4]) for key, entry in hot if entry[4]]
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['local_hit_rate'] = stats['local_hits'] / lookups if lookups else 0.0
+        return stats
+
+
+def get_local_tier(name, max_entries, max_bytes):
+    with _local_tiers_lock:
+        tier = _local_tiers.get(name)
+        if tier is None:
+            tier = _local_tiers[name] = LocalTier(max_entries, max_bytes)
+        return tier
+
+
+def local_tier_stats():
+    """
+    {LOCATION: статистика} по всем двухуровневым кэшам процесса.
+    """
+    with _local_tiers_lock:
+        tiers = list(_local_tiers.items())
+    return {name: tier.snapshot() for name, tier in tiers}
+
+
+def render_stats():
+    """
+    Статистика локальных уровней в текстовом формате Prometheus (для /metrics/).
+    """
+    lines = [
+        '# HELP portal_cache_lookups_total Чтения двухуровневого кэша по результату',
+        '# TYPE portal_cache_lookups_total counter',
+    ]
+    stats = sorted(local_tier_stats().items())
+    for name, tier in stats:
+        for result in ('local_hits', 'shared_hits', 'misses'):
+            lines.append(f'portal_cache_lookups_total{{cache="{name}",result="{result}"}} {tier[result]}')
+    for metric, field, kind, help_text in (
+        ('portal_cache_local_evictions_total', 'evictions', 'counter', 'Вытеснения из локального LRU'),
+        ('portal_cache_local_entries', 'entries', 'gauge', 'Записей в локальном LRU'),
+        ('portal_cache_local_bytes', 'bytes', 'gauge', 'Объём локального LRU'),
+        ('portal_cache_local_hit_rate', 'local_hit_rate', 'gauge', 'Доля чтений из памяти процесса'),
+    ):
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}']
+        lines += [f'{metric}{{cache="{name}"}} {tier[field]}' for name, tier in stats]
+    lines += ['# HELP portal_cache_hot_key_hits Самые читаемые ключи локального LRU', '# TYPE portal_cache_hot_key_hits gauge']
+    for name, tier in stats:
+        for key, hits in tier['hot_keys']:
+            lines.append(f'portal_cache_hot_key_hits{{cache="{name}",key="{label_value(key)}"}} {hits}')
+    return '\n'.join(lines) + '\n'
+
+
+class TwoTierCache(BaseCache):
+    """
+    Двухуровневый кэш: LRU в памяти процесса перед общим бэкендом
+    (Redis; в разработке и тестах — файловый или locmem).
+
+    Межпроцессная инвалидация — через штампы пространств имён (часть ключа
+    до первого «:»): запись ключа увеличивает штамп его пространства в общем
+    уровне, а процессы сверяют известные им штампы не чаще раза
+    в STAMP_CHECK_INTERVAL секунд. Так устаревшее значение живёт в чужом
+    процессе не дольше STAMP_CHECK_INTERVAL и не дольше LOCAL_TIMEOUT.
+    Штампам и версиям тегов атомарность incr не нужна: при гонке значение
+    всё равно меняется.
+
+    OPTIONS:
+        SHARED — настройки общего бэкенда (BACKEND, LOCATION, OPTIONS, ...);
+        LOCAL_MAX_ENTRIES, LOCAL_MAX_BYTES, LOCAL_TIMEOUT — границы локального LRU;
+        STAMP_CHECK_INTERVAL — период сверки штампов;
+        EXCLUDE — пространства счётчиков (add/incr/decr) без локального LRU;
+        COUNTERS — настройки бэкенда для пространств EXCLUDE (по умолчанию — SHARED).
+        Он должен быть из ATOMIC_BACKENDS, иначе ImproperlyConfigured.
+        IMMUTABLE — пространства, где ключ уже содержит версию (значение
+        под ключом не меняется), — запись не сдвигает штамп.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared = self._make_backend(options['SHARED'])
+        self._exclude = frozenset(options.get('EXCLUDE', ()))
+        counters = options.get('COUNTERS') or options['SHARED']
+        if self._exclude and counters['BACKEND'] not in ATOMIC_BACKENDS:
+            raise ImproperlyConfigured(
+                f"Счётчики {', '.join(sorted(self._exclude))} требуют атомарных incr/add, "
+                f"а {counters['BACKEND']} их не поддерживает: задайте COUNTERS (Redis или locmem)"
+            )
+        self._counters = self._make_backend(counters) if options.get('COUNTERS') else self._shared
+        self._tier = get_local_tier(
+            location or 'default',
+            options.get('LOCAL_MAX_ENTRIES', 1000),
+            options.get('LOCAL_MAX_BYTES', 16 * 1024 * 1024),
+        )
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._stamp_interval = options.get('STAMP_CHECK_INTERVAL', 1)
+        self._immutable = frozenset(options.get('IMMUTABLE', ()))
+
+    @staticmethod
+    def _make_backend(settings):
+        settings = dict(settings)
+        return import_string(settings.pop('BACKEND'))(settings.pop('LOCATION', ''), settings)
+
+    @staticmethod
+    def _namespace(key):
+        return str(key).split(':', 1)[0]
+
+    def _backend(self, key):
+        return self._counters if self._namespace(key) in self._exclude else self._shared
+
+    def _split(self, keys):
+        """
+        Ключи по бэкендам: {бэкенд: [ключи]}.
+        """
+        groups = {}
+        for key in keys:
+            groups.setdefault(self._backend(key), []).append(key)
+        return groups
+
+    def _local_key(self, key, version):
+        return self._shared.make_and_validate_key(key, version=version)
+
+    # Штампы
+
+    def _refresh_stamps(self, namespaces):
+        tier = self._tier
+        now = time.monotonic()
+        unknown = [namespace for namespace in namespaces if namespace not in tier.stamps]
+        if now - tier.stamps_checked >= self._stamp_interval:
+            tier.stamps_checked = now
+            unknown = list(set(tier.stamps) | set(unknown))
+        if not unknown:
+            return
+        keys = {f'{STAMP_KEY_PREFIX}{namespace}': namespace for namespace in unknown}
+        found = self._shared.get_many(list(keys))
+        for key, namespace in keys.items():
+            if key not in found:
+                # Штампа нет (новое пространство или общий уровень очищен) — заводим новый
+                self._shared.add(key, time.time_ns(), None)
+                found[key] = self._shared.get(key)
+            tier.stamps[namespace] = found[key]
+
+    def _bump(self, namespaces):
+        for namespace in set(namespaces) - self._exclude:
+            key = f'{STAMP_KEY_PREFIX}{namespace}'
+            try:
+                self._tier.stamps[namespace] = self._shared.incr(key)
+            except ValueError:
+                stamp = time.time_ns()
+                self._shared.set(key, stamp, None)
+                self._tier.stamps[namespace] = stamp
+
+    def _remember(self, key, value, version, namespace, stamp):
+        if namespace not in self._exclude:
+            self._tier.put(
+                self._local_key(key, version),
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                namespace,
+                stamp,
+                self._local_timeout,
+            )
+
+    # Чтение
+
+    def get(self, key, default=None, version=None):
+        return self._lookup([key], version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        return self._lookup(list(keys), version)
+
+    def _lookup(self, keys, version):
+        result = {}
+        remote = []
+        cacheable = {key for key in keys if self._namespace(key) not in self._exclude}
+        self._refresh_stamps({self._namespace(key) for key in cacheable})
+        for key in keys:
+            blob = self._tier.get(self._local_key(key, version)) if key in cacheable else None
+            if blob is None:
+                remote.append(key)
+            else:
+                result[key] = pickle.loads(blob)
+        if remote:
+            # Штампы — до чтения из общего уровня: если ключ перезапишут в это время,
+            # запись в LRU сразу окажется устаревшей
+            stamps = {key: self._tier.stamps.get(self._namespace(key)) for key in remote}
+            found = {}
+            for backend, backend_keys in self._split(remote).items():
+                found.update(backend.get_many(backend_keys, version=version))
+            self._tier.count('shared_hits', len(found))
+            self._tier.count('misses', len(remote) - len(found))
+            for key, value in found.items():
+                self._remember(key, value, version, self._namespace(key), stamps[key])
+            result.update(found)
+        record_cache(len(result), len(keys) - len(result))
+        return result
+
+    def has_key(self, key, version=None):
+        return self._backend(key).has_key(key, version=version)
+
+    # Запись
+
+    def _written(self, keys, version, values=None):
+        namespaces = {self._namespace(key) for key in keys}
+        if values is not None:
+            # Новое значение под версионированным ключом не делает устаревшими чужие копии
+            namespaces -= self._immutable
+        self._bump(namespaces)
+        for key in keys:
+            self._tier.discard(self._local_key(key, version))
+            if values is not None and key in values:
+                namespace = self._namespace(key)
+                self._remember(key, values[key], version, namespace, self._tier.stamps.get(namespace))
+
+    @staticmethod
+    def _expires_now(timeout):
+        return timeout is not DEFAULT_TIMEOUT and timeout is not None and timeout <= 0
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._backend(key).set(key, value, timeout, version=version)
+        self._written([key], version, None if self._expires_now(timeout) else {key: value})
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self._backend(key).add(key, value, timeout, version=version)
+        if added:
+            self._written([key], version, None if self._expires_now(timeout) else {key: value})
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = []
+        for backend, keys in self._split(data).items():
+            failed += backend.set_many({key: data[key] for key in keys}, timeout, version=version)
+        values = None if self._expires_now(timeout) else {
+            key: value for key, value in data.items() if key not in failed
+        }
+        self._written(list(data), version, values)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._backend(key).touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self._backend(key).incr(key, delta, version=version)
+        self._written([key], version)
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        value = self._backend(key).decr(key, delta, version=version)
+        self._written([key], version)
+        return value
+
+    def delete(self, key, version=None):
+        deleted = self._backend(key).delete(key, version=version)
+        self._written([key], version)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for backend, backend_keys in self._split(keys).items():
+            backend.delete_many(backend_keys, version=version)
+        self._written(keys, version)
+
+    def clear(self):
+        # Вместе с данными очищаются и штампы — другие процессы заведут новые и сбросят свои LRU
+        self._shared.clear()
+        if self._counters is not self._shared:
+            self._counters.clear()
+        self._tier.clear()
+
+    def close(self, **kwargs):
+        self._shared.close(**kwargs)
+        if self._counters is not self._shared:
+            self._counters.close(**kwargs)
+
+    def stats(self):
+        return self._tier.snapshot()
@@ -0,0 +1,198 @@
+import hashlib
+import re
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+from django.utils import timezone, translation
+
+TAG_VERSION_PREFIX = 'tag_version:'
+PAGE_KEY_PREFIX = 'page:'
+
+CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = '__csrf_token__'
+
+
+def post_tags(post):
+    """
+    Теги, от которых зависят страницы с этим постом.
+    """
+    return [f'posts:{post.post_type}', f'post:{post.pk}']
+
+
+def _tag_key(tag):
+    return f'{TAG_VERSION_PREFIX}{tag}'
+
+
+def get_tag_versions(tags):
+    """
+    Текущие версии тегов одним запросом к кэшу. Отсутствующая версия
+    (новый тег или вытесненный ключ) инициализируется временем, чтобы
+    не совпасть со старыми записями.
+    """
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_tags(*tags):
+    """
+    Инвалидация: все страницы, закэшированные с этими тегами,
+    перестают находиться по ключу и просто вытесняются по таймауту.
+    Новая версия — время изменения в наносекундах (не меньше старой + 1),
+    поэтому по ней же строится Last-Modified.
+    """
+    keys = [_tag_key(tag) for tag in tags]
+    if not keys:
+        return
+    current = cache.get_many(keys)
+    now = time.time_ns()
+    cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys}, None)
+
+
+def version_datetime(version):
+    return datetime.fromtimestamp(version / 1e9, tz=dt_timezone.utc)
+
+
+def page_cache_key(request, tags):
+    """
+    Ключ страницы: путь (с префиксом языка из i18n_patterns), язык
+    (включая cookie, которую учитывает home), часовой пояс и текущий
+    час в нём (от него зависит тема оформления), плюс версии тегов.
+    """
+    parts = [
+        request.get_full_path(),
+        translation.get_language() or '',
+        request.COOKIES.get(settings.LANGUAGE_COOKIE_NAME, ''),
+        timezone.get_current_timezone_name(),
+        timezone.localtime().strftime('%H'),
+        'anon',
+    ]
+    parts.extend(f'{tag}={version}' for tag, version in zip(tags, get_tag_versions(tags)))
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'{PAGE_KEY_PREFIX}{digest}'
+
+
+def _is_cacheable(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # Одноразовые сообщения (например, о смене часового пояса) не кэшируем
+    storage = getattr(request, '_messages', None)
+    return storage is None or not len(storage)
+
+
+def cache_page_tagged(tags, timeout=None):
+    """
+    Замена @cache_page с инвалидацией по тегам. Кэшируются только
+    ответы анонимным пользователям: страницы авторизованных содержат
+    имя пользователя и персональные кнопки.
+
+    tags — список тегов или функция (request, *args, **kwargs) -> список.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if not _is_cacheable(request):
+                return view_func(request, *args, **kwargs)
+
+            view_tags = tags(request, *args, **kwargs) if callable(tags) else list(tags)
+            key = page_cache_key(request, view_tags)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type, status = cached
+                if CSRF_PLACEHOLDER in content:
+                    content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+                return HttpResponse(content, content_type=content_type, status=status)
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                content = CSRF_INPUT_RE.sub(
+                    rf'\g<1>{CSRF_PLACEHOLDER}\g<2>',
+                    response.content.decode(response.charset),
+                )
+                cache.set(
+                    key,
+                    (content, response['Content-Type'], response.status_code),
+                    timeout if timeout is not None else settings.PAGE_CACHE_TIMEOUT,
+                )
+            return response
+        return _wrapped_view
+    return decorator
+
+
+def request_tag_versions(request, tags):
+    """
+    Версии тегов с запоминанием на запросе: etag_func и last_modified_func
+    вызываются по отдельности, а к кэшу хватает одного обращения.
+    """
+    memo = request.__dict__.setdefault('_tag_versions', {})
+    key = tuple(tags)
+    if key not in memo:
+        memo[key] = get_tag_versions(tags)
+    return memo[key]
+
+
+def conditional_tagged(tags, personal=True):
+    """
+    Условный GET (ETag / Last-Modified, ответ 304) по версиям тегов —
+    без запросов к базе, рендера шаблона и сериализации.
+
+    Валидаторы меняются только вместе с версиями тегов, то есть при
+    изменениях через сигналы; правки мимо них (QuerySet.update()) не видны
+    так же, как и кэшу страниц.
+
+    Last-Modified — время последней версии тегов (версия — time_ns момента
+    изменения), а не Post.updated_at: его пришлось бы читать из базы.
+
+    tags — список тегов или функция (request, *args, **kwargs) -> список.
+    personal — HTML-страница: валидаторы выдаются только анонимам (как и в
+    cache_page_tagged — у авторизованных подписки и кнопки не отражены в тегах)
+    и учитывают cookie языка и текущий час (тема оформления). Для API
+    достаточно пути, языка и часового пояса.
+    """
+    def _view_tags(request, *args, **kwargs):
+        return tags(request, *args, **kwargs) if callable(tags) else list(tags)
+
+    def _skip(request):
+        if personal and request.user.is_authenticated:
+            return True
+        # Одноразовые сообщения показываются один раз — такую страницу не подтверждаем
+        storage = getattr(request, '_messages', None)
+        return storage is not None and len(storage)
+
+    def etag_func(request, *args, **kwargs):
+        if _skip(request):
+            return None
+        view_tags = _view_tags(request, *args, **kwargs)
+        parts = [
+            request.get_full_path(),
+            translation.get_language() or '',
+            timezone.get_current_timezone_name(),
+        ]
+        if personal:
+            parts += [
+                request.COOKIES.get(settings.LANGUAGE_COOKIE_NAME, ''),
+                timezone.localtime().strftime('%H'),
+            ]
+        parts.extend(f'{tag}={version}' for tag, version in zip(view_tags, request_tag_versions(request, view_tags)))
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def last_modified_func(request, *args, **kwargs):
+        if _skip(request):
+            return None
+        view_tags = _view_tags(request, *args, **kwargs)
+        versions = request_tag_versions(request, view_tags)
+        return version_datetime(max(versions)) if versions else None
+
+    return condition(etag_func=etag_func, last_modified_func=last_modified_func)
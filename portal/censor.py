@@ -0,0 +1,79 @@
+import re
+
+from django.conf import settings
+
+CENSORED_FIELDS = ('title', 'content')
+
+
+def _trie_pattern(words):
+    """
+    Собирает регулярку из префиксного дерева слов: общие префиксы
+    проверяются один раз, поэтому длина списка почти не влияет на скорость.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        is_end = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+        pattern = '(?:' + '|'.join(branches) + ')'
+        return pattern + '?' if is_end else pattern
+
+    return build(trie)
+
+
+def _mask(match):
+    word = match.group()
+    return word[0] + '*' * (len(word) - 1)
+
+
+class CensorEngine:
+    """
+    Весь список запрещённых слов компилируется в одну регулярку без учёта
+    регистра. Список можно перезагрузить через load().
+    """
+
+    def __init__(self, words=()):
+        self.load(words)
+
+    def load(self, words):
+        self.words = frozenset(word.strip().lower() for word in words if word and word.strip())
+        if self.words:
+            self._pattern = re.compile(r'\b(?:' + _trie_pattern(self.words) + r')\b', re.IGNORECASE)
+        else:
+            self._pattern = None
+
+    def censor(self, text):
+        if not text or self._pattern is None:
+            return text
+        return self._pattern.sub(_mask, text)
+
+
+engine = CensorEngine(settings.CENSOR_BANNED_WORDS)
+
+
+def reload(words=None):
+    """
+    Перечитывает список слов (по умолчанию из settings.CENSOR_BANNED_WORDS).
+    Сохранённые в постах тексты после этого пересчитывает команда censor_posts.
+    """
+    engine.load(settings.CENSOR_BANNED_WORDS if words is None else words)
+
+
+def censored_field_values(post):
+    """
+    Значения censored_<поле>_<язык> для всех переводов поста.
+    """
+    values = {}
+    for field in CENSORED_FIELDS:
+        for lang in settings.MODELTRANSLATION_LANGUAGES:
+            values[f'censored_{field}_{lang}'] = engine.censor(getattr(post, f'{field}_{lang}') or '')
+    return values
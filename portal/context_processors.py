@@ -2,21 +2,29 @@ from allauth.socialaccount import providers
 import pytz
 from django.utils import timezone
 
+# Контекст не зависит от запроса — словари создаются один раз
+ACCOUNT_CONTEXT = {
+    "ACCOUNT_ALLOW_REGISTRATION": True,
+}
+
+SOCIALACCOUNT_CONTEXT = {
+    "socialaccount_requests": [],
+    "socialaccount_providers": [
+        {"id": "google", "name": "Google"},
+        {"id": "yandex", "name": "Yandex"}
+    ]
+}
+
 def account(request):
-    return {
-        "ACCOUNT_ALLOW_REGISTRATION": True,
-    }
+    return ACCOUNT_CONTEXT
 
 def socialaccount(request):
-    return {
-        "socialaccount_requests": [],
-        "socialaccount_providers": [
-            {"id": "google", "name": "Google"},
-            {"id": "yandex", "name": "Yandex"}
-        ]
-    }
+    return SOCIALACCOUNT_CONTEXT
 
 def timezones(request):
+    # Шаблон вызывает функции только при обращении к переменной;
+    # базовый шаблон выводит пояса готовым фрагментом ({% timezone_options %})
     return {
-        'timezones': pytz.common_timezones
-    }
\ No newline at end of file
+        'timezones': lambda: pytz.common_timezones,
+        'current_timezone': timezone.get_current_timezone_name,
+    }
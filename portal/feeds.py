@@ -0,0 +1,152 @@
+import hashlib
+import json
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone, translation
+from django.utils.feedgenerator import rfc2822_date, rfc3339_date
+
+from .caching import request_tag_versions
+
+FEED_KEY_PREFIX = 'page:feed:'  # версия тегов входит в ключ — пространство page неизменяемое
+FEED_FORMATS = {
+    'rss': 'application/rss+xml; charset=utf-8',
+    'atom': 'application/atom+xml; charset=utf-8',
+    'json': 'application/feed+json; charset=utf-8',
+}
+
+
+def feed_tags(post_type=None, category_id=None):
+    if category_id is not None:
+        # Правки постов двигают только posts:<тип> и post:<id> — их ловят теги типов
+        return [f'category:{category_id}', 'posts:news', 'posts:article']
+    return [f'posts:{post_type}']
+
+
+def feed_posts(post_type=None, category_id=None):
+    """
+    Последние FEED_ITEMS постов: только колонки ленты на языке запроса
+    (modeltranslation подставляет перевод или язык по умолчанию).
+    """
+    from .models import Post
+
+    columns = [
+        f'{field}_{lang}'
+        for field in ('censored_title', 'censored_content')
+        for lang in settings.MODELTRANSLATION_LANGUAGES
+    ]
+    posts = Post.objects.select_related('author__user').only(
+        'id', 'post_type', 'created_at', 'updated_at', 'author__user__username', *columns,
+    )
+    if category_id is not None:
+        posts = posts.filter(postcategory__category_id=category_id)
+    else:
+        posts = posts.filter(post_type=post_type)
+    return posts.order_by('-created_at', '-id')[:settings.FEED_ITEMS]
+
+
+def feed_cache_key(request, tags):
+    # Ссылки в ленте абсолютные — схема и хост входят в ключ
+    parts = [request.scheme, request.get_host(), request.path, translation.get_language() or '']
+    parts.extend(f'{tag}={version}' for tag, version in zip(tags, request_tag_versions(request, tags)))
+    return FEED_KEY_PREFIX + hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def _entries(request, posts):
+    """
+    (пост, абсолютный URL) по мере чтения из базы — объекты не копятся в памяти.
+    """
+    for post in posts.iterator(chunk_size=settings.FEED_CHUNK_SIZE):
+        yield post, request.build_absolute_uri(post.get_absolute_url())
+
+
+def render_rss(request, title, link, posts):
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>'
+        f'<title>{escape(title)}</title><link>{escape(link)}</link>'
+        f'<description>{escape(title)}</description>'
+        f'<language>{translation.get_language()}</language>'
+        f'<atom:link href={quoteattr(request.build_absolute_uri())} rel="self"/>'
+    )
+    for post, url in _entries(request, posts):
+        yield (
+            f'<item><title>{escape(post.censored_title)}</title><link>{escape(url)}</link>'
+            f'<description>{escape(post.censored_content)}</description>'
+            f'<author>{escape(post.author.user.username)}</author>'
+            f'<pubDate>{rfc2822_date(post.created_at)}</pubDate>'
+            f'<guid>{escape(url)}</guid></item>'
+        )
+    yield '</channel></rss>\n'
+
+
+def render_atom(request, title, link, posts):
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        f'<feed xmlns="http://www.w3.org/2005/Atom" xml:lang="{translation.get_language()}">'
+        f'<title>{escape(title)}</title><link href={quoteattr(link)} rel="alternate"/>'
+        f'<link href={quoteattr(request.build_absolute_uri())} rel="self"/>'
+        f'<id>{escape(link)}</id>'
+    )
+    updated = False
+    for post, url in _entries(request, posts):
+        if not updated:
+            # Посты идут от новых к старым: время первого — время обновления ленты
+            yield f'<updated>{rfc3339_date(post.updated_at)}</updated>'
+            updated = True
+        yield (
+            f'<entry><title>{escape(post.censored_title)}</title><link href={quoteattr(url)} rel="alternate"/>'
+            f'<id>{escape(url)}</id><published>{rfc3339_date(post.created_at)}</published>'
+            f'<updated>{rfc3339_date(post.updated_at)}</updated>'
+            f'<author><name>{escape(post.author.user.username)}</name></author>'
+            f'<content type="text">{escape(post.censored_content)}</content></entry>'
+        )
+    if not updated:
+        # <updated> в Atom обязателен и для пустой ленты
+        yield f'<updated>{rfc3339_date(timezone.now())}</updated>'
+    yield '</feed>\n'
+
+
+def render_json(request, title, link, posts):
+    header = json.dumps({
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': title,
+        'home_page_url': link,
+        'feed_url': request.build_absolute_uri(),
+        'language': translation.get_language(),
+    }, ensure_ascii=False)
+    # Заголовок без закрывающей скобки, дальше — элементы массива items по одному
+    yield header[:-1] + ', "items": ['
+    separator = ''
+    for post, url in _entries(request, posts):
+        yield separator + json.dumps({
+            'id': url,
+            'url': url,
+            'title': post.censored_title,
+            'content_text': post.censored_content,
+            'date_published': post.created_at.isoformat(),
+            'date_modified': post.updated_at.isoformat(),
+            'authors': [{'name': post.author.user.username}],
+        }, ensure_ascii=False)
+        separator = ', '
+    yield ']}\n'
+
+
+RENDERERS = {'rss': render_rss, 'atom': render_atom, 'json': render_json}
+
+
+def stream_feed(key, chunks, language):
+    """
+    Отдаёт куски ленты по мере рендера; целиком отрендеренное тело
+    сохраняется в кэш под версией тегов, так что до следующего изменения
+    лента отдаётся без запросов к базе.
+    """
+    # Генератор дочитывается уже после выхода из view — язык запроса задаём явно
+    with translation.override(language):
+        body = []
+        for chunk in chunks:
+            data = chunk.encode('utf-8')
+            body.append(data)
+            yield data
+    cache.set(key, b''.join(body), settings.FEED_CACHE_TIMEOUT)
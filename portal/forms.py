@@ -1,7 +1,7 @@
 from django import forms
-from .models import Post, Category
+from .models import Post, Category, Comment
 from allauth.account.forms import SignupForm
-from django.utils import timezone
+from . import quota
 from django.utils.translation import gettext_lazy as _
 import logging
 
@@ -51,13 +51,9 @@ class NewsForm(forms.ModelForm):
         if not cleaned_data.get('categories'):
             raise forms.ValidationError(_("Select at least one category!"))
 
-        # Проверка лимита публикаций
-        today = timezone.localtime(timezone.now()).date()
-        if Post.objects.filter(
-                author=author,
-                post_type='news',
-                created_at__date=today
-        ).count() >= 3:
+        # Проверка лимита публикаций — только для новой новости и только для
+        # иначе корректной формы, чтобы не расходовать лимит впустую
+        if self.instance.pk is None and not self.errors and not quota.consume(author):
             raise forms.ValidationError(_("You cannot publish more than 3 news per day!"))
 
         return cleaned_data
@@ -86,4 +82,12 @@ class CustomSignupForm(SignupForm):
         user = super().save(request)
         from .models import Author  # Локальный импорт для избежания циклических зависимостей
         Author.objects.get_or_create(user=user)
-        return user
\ No newline at end of file
+        return user
+
+
+class CommentForm(forms.ModelForm):
+    class Meta:
+        model = Comment
+        fields = ['text']
+        labels = {'text': _("Comment")}
+        widgets = {'text': forms.Textarea(attrs={'rows': 3})}
@@ -0,0 +1,57 @@
+import random
+import re
+import timeit
+
+from django.core.management.base import BaseCommand
+from portal.censor import CensorEngine
+
+ALPHABET = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+
+
+def legacy_censor(value, banned_words):
+    """
+    Прежняя реализация фильтра censor: отдельная регулярка на каждое слово.
+    """
+    def repl(match):
+        word = match.group()
+        return word[0] + '*' * (len(word) - 1)
+
+    for banned in banned_words:
+        pattern = r'\b(?:' + re.escape(banned) + '|' + re.escape(banned.capitalize()) + r')\b'
+        value = re.sub(pattern, repl, value)
+    return value
+
+
+def random_word(rng, min_len=3, max_len=10):
+    return ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(min_len, max_len)))
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость старого фильтра censor и CensorEngine на длинных текстах и больших списках слов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--words', type=int, nargs='+', default=[1, 100, 1000], help='Размеры списков слов')
+        parser.add_argument('--text-words', type=int, default=5000, help='Длина текста в словах')
+        parser.add_argument('--repeat', type=int, default=5, help='Число повторов замера')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        repeat = options['repeat']
+
+        self.stdout.write(f"{'слов':>6} {'legacy, мс':>12} {'engine, мс':>12} {'ускорение':>10}")
+        for size in options['words']:
+            banned = ['редиска'] + [random_word(rng) for _ in range(size - 1)]
+            vocabulary = [random_word(rng) for _ in range(200)] + banned[:50] + [w.capitalize() for w in banned[:50]]
+            text = ' '.join(rng.choice(vocabulary) for _ in range(options['text_words']))
+            engine = CensorEngine(banned)
+
+            # Результат не должен отличаться для слов в нижнем регистре и с заглавной буквы
+            if legacy_censor(text, banned) != engine.censor(text):
+                self.stdout.write(self.style.WARNING(f'{size}: результаты различаются'))
+
+            legacy = min(timeit.repeat(lambda: legacy_censor(text, banned), number=1, repeat=repeat))
+            compiled = min(timeit.repeat(lambda: engine.censor(text), number=1, repeat=repeat))
+            self.stdout.write(
+                f'{size:>6} {legacy * 1000:>12.2f} {compiled * 1000:>12.2f} {legacy / compiled:>9.1f}x'
+            )
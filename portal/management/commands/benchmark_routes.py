@@ -0,0 +1,275 @@
+import json
+import math
+import random
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from allauth.account.models import EmailAddress
+# Задачи @shared_task берут приложение из current_app — режим eager включается у него
+from celery import current_app as app
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import translation
+from portal.censor import censored_field_values
+from portal.models import Author, Category, Comment, Post, PostCategory
+from portal.search import get_backend as get_search_backend
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+WORDS = ['новости', 'политика', 'спорт', 'экономика', 'погода', 'наука', 'культура', 'редиска', 'город', 'событие']
+
+
+def percentile(values, percent):
+    """
+    Процентиль методом ближайшего ранга (values отсортированы).
+    """
+    rank = math.ceil(percent / 100 * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет маршруты portal/urls.py на сгенерированных данных: p50/p95/p99, '
+        'число запросов к базе и размер ответа. Данные создаются в транзакции и откатываются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000, help='Число постов')
+        parser.add_argument('--categories', type=int, default=20, help='Число категорий')
+        parser.add_argument('--subscribers', type=int, default=200, help='Число подписчиков')
+        parser.add_argument('--comments', type=int, default=2000, help='Число комментариев')
+        parser.add_argument('--requests', type=int, default=50, help='Замеров на маршрут')
+        parser.add_argument('--warmup', type=int, default=3, help='Прогревочных запросов на маршрут')
+        parser.add_argument('--routes', nargs='+', help='Замерить только эти маршруты')
+        parser.add_argument('--cold-cache', action='store_true', help='Очищать кэш перед каждым запросом')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        eager = app.conf.task_always_eager
+        # Уведомления о новых постах выполняются в процессе — их стоимость входит в замер создания
+        app.conf.task_always_eager = True
+        try:
+            with override_settings(
+                CACHES=LOCMEM_CACHE,
+                EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                # Иначе замер создания упрётся в суточный лимит после третьей новости,
+                # а замер комментариев — в ограничение частоты
+                NEWS_DAILY_LIMIT=10 ** 9,
+                COMMENT_RATE_LIMIT=10 ** 9,
+            ), transaction.atomic():
+                results = self.run_benchmark(options)
+                transaction.set_rollback(True)
+        finally:
+            app.conf.task_always_eager = eager
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Результаты записаны в {options['output']}"))
+
+    def run_benchmark(self, options):
+        from django.core.cache import cache
+        cache.clear()
+
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        data = self.seed(rng, options)
+        self.stdout.write(f'Данные созданы за {time.perf_counter() - started:.1f} с')
+
+        anonymous = Client()
+        author = Client()
+        author.force_login(data['author'].user)
+
+        with translation.override(settings.LANGUAGE_CODE):
+            routes = self.routes(data, anonymous, author)
+
+        selected = options['routes']
+        results = {}
+        self.stdout.write(
+            f"{'маршрут':<22} {'код':>4} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'запросы':>8} {'байт':>9}"
+        )
+        for name, client, method, path, payload in routes:
+            if selected and name not in selected:
+                continue
+            results[name] = self.measure(client, method, path, payload, options, cache)
+            row = results[name]
+            self.stdout.write(
+                f"{name:<22} {row['status']:>4} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                f"{row['p99_ms']:>9.2f} {row['queries']:>8} {row['bytes']:>9}"
+            )
+
+        return {
+            'meta': {
+                'created_at': datetime.now(dt_timezone.utc).isoformat(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'cold_cache': options['cold_cache'],
+                'requests': options['requests'],
+                'seed': options['seed'],
+                'dataset': {key: options[key] for key in ('posts', 'categories', 'subscribers', 'comments')},
+            },
+            'routes': results,
+        }
+
+    def seed(self, rng, options):
+        """
+        Набор данных массовыми вставками. bulk_create не вызывает save() и сигналы,
+        поэтому цензура и поисковый индекс считаются здесь же.
+        """
+        users = User.objects.bulk_create([
+            User(username=f'bench_user_{i}', email=f'bench_user_{i}@example.com')
+            for i in range(max(options['subscribers'], 1))
+        ])
+        authors = Author.objects.bulk_create([Author(user=user) for user in users[:max(len(users) // 10, 1)]])
+        author = authors[0]
+        EmailAddress.objects.create(user=author.user, email=author.user.email, verified=True, primary=True)
+        author.user.groups.add(Group.objects.get_or_create(name='authors')[0])
+
+        categories = Category.objects.bulk_create([
+            Category(name=f'Бенчмарк {i}') for i in range(max(options['categories'], 1))
+        ])
+        Category.subscribers.through.objects.bulk_create([
+            Category.subscribers.through(category=rng.choice(categories), user=user) for user in users
+        ], ignore_conflicts=True)
+
+        posts = []
+        for i in range(options['posts']):
+            post = Post(
+                author=rng.choice(authors),
+                post_type=rng.choice((Post.NEWS, Post.ARTICLE)),
+                title=' '.join(rng.choices(WORDS, k=4)),
+                content=' '.join(rng.choices(WORDS, k=200)),
+            )
+            for name, value in censored_field_values(post).items():
+                setattr(post, name, value)
+            posts.append(post)
+        posts = Post.objects.bulk_create(posts, batch_size=500)
+        PostCategory.objects.bulk_create([
+            PostCategory(post=post, category=category)
+            for post in posts
+            for category in rng.sample(categories, min(2, len(categories)))
+        ], batch_size=1000)
+        if posts:
+            comments = [
+                Comment(post=rng.choice(posts), user=rng.choice(users), text=' '.join(rng.choices(WORDS, k=20)))
+                for _ in range(options['comments'])
+            ]
+            for comment in comments:
+                comment.post.comment_count += 1
+            Comment.objects.bulk_create(comments, batch_size=1000)
+            Post.objects.bulk_update(posts, ['comment_count'], batch_size=1000)
+        get_search_backend().rebuild()
+
+        news = next((post for post in posts if post.post_type == Post.NEWS), None)
+        article = next((post for post in posts if post.post_type == Post.ARTICLE), None)
+        own_news = next((post for post in posts if post.post_type == Post.NEWS and post.author_id == author.pk), None)
+        own_article = next((post for post in posts if post.post_type == Post.ARTICLE and post.author_id == author.pk), None)
+        return {
+            'author': author, 'categories': categories, 'news': news, 'article': article,
+            'own_news': own_news, 'own_article': own_article,
+        }
+
+    def routes(self, data, anonymous, author):
+        """
+        (имя, клиент, метод, путь, данные) для маршрутов portal/urls.py.
+        Удаление постов (POST) не замеряется — повторные запросы получили бы 404,
+        только страницы подтверждения. Запросы выполняются по порядку списка.
+        """
+        category = data['categories'][0]
+        post_data = {'title': 'Бенчмарк', 'content': 'Текст новости', 'categories': [category.pk]}
+        routes = [
+            ('home', anonymous, 'get', reverse('home'), None),
+            ('news_list', anonymous, 'get', reverse('news_list'), None),
+            ('news_list_page_3', anonymous, 'get', reverse('news_list') + '?page=3', None),
+            ('news_list_author', author, 'get', reverse('news_list'), None),
+            ('article_list', anonymous, 'get', reverse('article_list'), None),
+            ('news_search', anonymous, 'get', reverse('news_search') + '?title=' + WORDS[0], None),
+            ('news_create_form', author, 'get', reverse('news_create'), None),
+            ('article_create_form', author, 'get', reverse('article_create'), None),
+            ('become_author', author, 'get', reverse('become_author'), None),
+            ('subscribe', author, 'get', reverse('subscribe', args=[category.pk]), None),
+            ('unsubscribe', author, 'get', reverse('unsubscribe', args=[category.pk]), None),
+            ('set_timezone', author, 'post', reverse('set_timezone'), {'timezone': 'Europe/Moscow'}),
+            ('news_feed_rss', anonymous, 'get', reverse('news_feed', args=['rss']), None),
+            ('category_feed_atom', anonymous, 'get', reverse('category_feed', args=[category.pk, 'atom']), None),
+            ('api_news_list', anonymous, 'get', reverse('news-api-list'), None),
+            ('api_article_list', anonymous, 'get', reverse('articles-api-list'), None),
+        ]
+        if data['news']:
+            news = data['news']
+            routes += [
+                ('news_detail', anonymous, 'get', reverse('news_detail', args=[news.pk]), None),
+                ('api_news_detail', anonymous, 'get', reverse('news-api-detail', args=[news.pk]), None),
+                ('api_comments_list', anonymous, 'get', reverse('comments-api-list', args=[news.pk]), None),
+            ]
+        if data['own_news']:
+            own = data['own_news']
+            routes += [
+                ('news_edit_form', author, 'get', reverse('news_edit', args=[own.pk]), None),
+                ('news_delete_form', author, 'get', reverse('news_delete', args=[own.pk]), None),
+            ]
+        if data['own_article']:
+            own = data['own_article']
+            routes += [
+                ('article_edit_form', author, 'get', reverse('article_edit', args=[own.pk]), None),
+                ('article_delete_form', author, 'get', reverse('article_delete', args=[own.pk]), None),
+            ]
+        if data['article']:
+            routes.append(
+                ('api_article_detail', anonymous, 'get', reverse('articles-api-detail', args=[data['article'].pk]), None)
+            )
+        # Создание — последним, чтобы новые посты и комментарии не попадали в замеры списков
+        if data['news']:
+            routes.append(
+                ('add_comment', author, 'post', reverse('add_comment', args=[data['news'].pk]), {'text': 'Бенчмарк'})
+            )
+        routes += [
+            ('news_create', author, 'post', reverse('news_create'), post_data),
+            ('api_news_create', author, 'post', reverse('news-api-list'), post_data),
+        ]
+        return routes
+
+    def measure(self, client, method, path, payload, options, cache):
+        request = getattr(client, method)
+
+        def call():
+            if options['cold_cache']:
+                cache.clear()
+            return request(path, payload) if payload is not None else request(path)
+
+        for _ in range(options['warmup']):
+            call()
+
+        timings, queries, sizes, statuses = [], [], [], set()
+        for _ in range(max(options['requests'], 1)):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = call()
+                if response.streaming:
+                    size = sum(len(chunk) for chunk in response.streaming_content)
+                else:
+                    size = len(response.content)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+            sizes.append(size)
+            statuses.add(response.status_code)
+
+        timings.sort()
+        return {
+            'method': method.upper(),
+            'path': path,
+            'status': min(statuses) if len(statuses) == 1 else '/'.join(map(str, sorted(statuses))),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries': max(queries),
+            'bytes': max(sizes),
+        }
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from portal import censor
+from portal.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённые цензурированные заголовки и тексты постов (после изменения списка слов)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Размер пачки для bulk_update')
+
+    def handle(self, *args, **options):
+        censor.reload()
+        batch_size = options['batch_size']
+        names = [
+            f'censored_{field}_{lang}'
+            for field in censor.CENSORED_FIELDS
+            for lang in settings.MODELTRANSLATION_LANGUAGES
+        ]
+
+        updated = 0
+        batch = []
+        for post in Post.objects.iterator(chunk_size=batch_size):
+            for name, value in censor.censored_field_values(post).items():
+                setattr(post, name, value)
+            batch.append(post)
+            if len(batch) >= batch_size:
+                Post.objects.bulk_update(batch, names)
+                updated += len(batch)
+                batch = []
+        if batch:
+            Post.objects.bulk_update(batch, names)
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано постов: {updated}'))
@@ -1,24 +1,108 @@
+from datetime import timedelta
+
+from django.core.cache import cache
 from django.core.management.base import BaseCommand
-from portal.models import Post, Category
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from portal import quota, votes
+from portal.caching import bump_tags
+from portal.models import Author, Category, Comment, Post, PostCategory
+from portal.pagination import count_cache_key
+from portal.search import get_backend as get_search_backend
+from portal.showcase import refresh_showcase
+
 
 class Command(BaseCommand):
-    help = 'Удаляет все новости из указанной категории после подтверждения'
+    help = (
+        'Удаляет все новости из указанной категории после подтверждения. '
+        'Удаление идёт пачками по id, каждая — в своей короткой транзакции'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument('category', type=str, help='Имя категории, новости из которой нужно удалить')
+        parser.add_argument('--batch-size', type=int, default=500, help='Новостей в одной транзакции')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, что будет удалено')
+        parser.add_argument('--no-input', action='store_true', help='Не спрашивать подтверждение')
 
     def handle(self, *args, **options):
         category_name = options['category']
-        self.stdout.write(f'Вы действительно хотите удалить все новости в категории "{category_name}"? (yes/no)')
-        answer = input()
-
-        if answer.lower() != 'yes':
-            self.stdout.write(self.style.ERROR('Отменено'))
-            return
-
         try:
             category = Category.objects.get(name=category_name)
-            news_count = Post.objects.filter(post_type='news', categories=category).delete()[0]
-            self.stdout.write(self.style.SUCCESS(f'Успешно удалено {news_count} новостей из категории "{category.name}"'))
         except Category.DoesNotExist:
-            self.stdout.write(self.style.ERROR(f'Категория "{category_name}" не найдена'))
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f'Категория "{category_name}" не найдена'))
+            return
+
+        news = Post.objects.filter(post_type='news', postcategory__category=category)
+        total = news.count()
+        if options['dry_run']:
+            comments = Comment.objects.filter(post__in=news.values('id')).count()
+            links = PostCategory.objects.filter(post__in=news.values('id')).count()
+            self.stdout.write(
+                f'Будет удалено новостей: {total}, комментариев: {comments}, '
+                f'связей с категориями: {links} (категория "{category.name}")'
+            )
+            return
+        if not total:
+            self.stdout.write(f'В категории "{category.name}" нет новостей')
+            return
+
+        if not options['no_input']:
+            self.stdout.write(f'Вы действительно хотите удалить {total} новостей в категории "{category.name}"? (yes/no)')
+            if input().lower() != 'yes':
+                self.stdout.write(self.style.ERROR('Отменено'))
+                return
+
+        deleted, categories, recent = self.delete_in_batches(category, options['batch_size'], total)
+        self.invalidate(categories, recent)
+        self.stdout.write(self.style.SUCCESS(f'Успешно удалено {deleted} новостей из категории "{category.name}"'))
+
+    def delete_in_batches(self, category, batch_size, total):
+        """
+        Пачки id берутся по индексу (category, post) с ключевой пагинацией,
+        так что в памяти — не больше batch_size строк. Зависимые строки
+        удаляются массово (_raw_delete: без загрузки объектов и сигналов
+        на каждый из них); индекс поиска и теги постов — по пачке,
+        общая инвалидация — в invalidate() после всех пачек.
+        """
+        search = get_search_backend()
+        recent_since = timezone.now() - timedelta(days=2)
+        deleted = 0
+        last_id = 0
+        categories = {category.pk}
+        recent = []  # (author_id, created_at) сегодняшних новостей — для лимита публикаций
+        while True:
+            rows = list(
+                Post.objects.filter(post_type='news', postcategory__category=category, pk__gt=last_id)
+                .order_by('pk')
+                .values_list('pk', 'author_id', 'created_at')[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            ids = [row[0] for row in rows]
+
+            with transaction.atomic():
+                links = PostCategory.objects.filter(post_id__in=ids)
+                categories.update(links.values_list('category_id', flat=True).distinct())
+                # _raw_delete не шлёт post_delete — вклад в рейтинги авторов снимается здесь
+                votes.withdraw(Comment, Comment.objects.filter(post_id__in=ids))
+                votes.withdraw(Post, Post.objects.filter(pk__in=ids))
+                Comment.objects.filter(post_id__in=ids)._raw_delete(DEFAULT_DB_ALIAS)
+                links._raw_delete(DEFAULT_DB_ALIAS)
+                Post.objects.filter(pk__in=ids)._raw_delete(DEFAULT_DB_ALIAS)
+                for post_id in ids:
+                    search.remove_post(post_id)
+
+            bump_tags(*(f'post:{post_id}' for post_id in ids))
+            recent += [(author_id, created_at) for _, author_id, created_at in rows if created_at >= recent_since]
+            deleted += len(ids)
+            self.stdout.write(f'Удалено {deleted} из {total}')
+        return deleted, categories, recent
+
+    def invalidate(self, categories, recent):
+        cache.delete(count_cache_key('news'))
+        bump_tags('posts:news', *(f'category:{pk}' for pk in categories))
+        refresh_showcase()
+        authors = Author.objects.in_bulk({author_id for author_id, _ in recent})
+        for author_id, created_at in recent:
+            quota.release(authors[author_id], created_at)
@@ -0,0 +1,239 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import translation
+from portal.caching import bump_tags
+from portal.censor import censored_field_values
+from portal.models import Author, Category, Post, PostCategory
+from portal.pagination import count_cache_key
+from portal.search import get_backend as get_search_backend
+from portal.showcase import refresh_showcase
+from portal.tasks import imported_posts_digest, translate_missing_posts
+
+POST_TYPES = {value for value, _ in Post.POST_TYPES}
+# Разделитель категорий в колонке categories CSV
+CSV_CATEGORY_SEPARATOR = '|'
+# Строковые поля строки импорта; в JSONL там может оказаться что угодно
+STRING_FIELDS = ('title', 'content', 'author', 'post_type', 'title_en', 'content_en')
+
+
+class Command(BaseCommand):
+    help = (
+        'Массовый импорт постов из JSONL или CSV (поля: title, content, author, '
+        'categories, post_type, title_en, content_en). Строки читаются потоком, '
+        'посты и их категории пишутся bulk_create пачками; уведомления, перевод '
+        'и инвалидация кэша — один раз после импорта. Лимит публикаций не применяется'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с постами; «-» — стандартный ввод')
+        parser.add_argument('--format', choices=('jsonl', 'csv'), help='По умолчанию — по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Строк в одной транзакции')
+        parser.add_argument('--author', help='Автор (username) для строк без author')
+        parser.add_argument('--create-categories', action='store_true', help='Создавать отсутствующие категории')
+        parser.add_argument('--no-notify', action='store_true', help='Не рассылать подписчикам письмо об импорте')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        self.default_author = options['author']
+        self.create_categories = options['create_categories']
+        self.authors = {}
+        self.categories_created = False
+        self.search = get_search_backend()
+
+        # Имена категорий modeltranslation ищет по языку по умолчанию
+        with translation.override(settings.MODELTRANSLATION_DEFAULT_LANGUAGE):
+            self.categories = dict(Category.objects.values_list('name', 'id'))
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+            try:
+                stats = self.import_rows(self.read_rows(stream, fmt), options['batch_size'])
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+
+        self.finish(stats, notify=not options['no_notify'])
+
+    @staticmethod
+    def read_rows(stream, fmt):
+        """
+        (номер строки, dict) по одной строке входа.
+        """
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(stream), start=2):
+                categories = row.get('categories') or ''
+                row['categories'] = [name for name in categories.split(CSV_CATEGORY_SEPARATOR) if name.strip()]
+                yield number, row
+            return
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                row = {'_error': f'неверный JSON: {e}'}
+            yield number, row if isinstance(row, dict) else {'_error': 'строка не JSON-объект'}
+
+    def import_rows(self, rows, batch_size):
+        stats = {'imported': 0, 'skipped': 0, 'ids': [], 'post_types': set(), 'categories': set()}
+        started = time.perf_counter()
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            self.import_batch(batch, stats)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Импортировано {stats['imported']}, пропущено {stats['skipped']} "
+                f"({stats['imported'] / elapsed if elapsed else 0:.0f} строк/с)"
+            )
+        stats['elapsed'] = time.perf_counter() - started
+        return stats
+
+    def import_batch(self, batch, stats):
+        rows = []
+        for number, row in batch:
+            try:
+                rows.append((number, self.clean_row(row)))
+            except ValueError as e:
+                self.skip(stats, number, e)
+
+        self.resolve_authors({row['author'] for _, row in rows})
+        if self.create_categories:
+            self.ensure_categories({name for _, row in rows for name in row['categories']})
+
+        posts, links = [], []
+        for number, row in rows:
+            try:
+                post, category_ids = self.build_post(row)
+            except ValueError as e:
+                self.skip(stats, number, e)
+                continue
+            posts.append(post)
+            links.append(category_ids)
+
+        with transaction.atomic():
+            # На SQLite и PostgreSQL bulk_create возвращает id созданных строк
+            posts = Post.objects.bulk_create(posts)
+            PostCategory.objects.bulk_create([
+                PostCategory(post_id=post.pk, category_id=category_id)
+                for post, category_ids in zip(posts, links)
+                for category_id in category_ids
+            ])
+            for post in posts:
+                self.search.index_post(post)
+
+        stats['imported'] += len(posts)
+        stats['ids'] += [post.pk for post in posts if post.post_type == Post.NEWS]
+        stats['post_types'].update(post.post_type for post in posts)
+        stats['categories'].update(category_id for category_ids in links for category_id in category_ids)
+
+    def skip(self, stats, number, error):
+        stats['skipped'] += 1
+        self.stderr.write(f'Строка {number}: {error}')
+
+    def resolve_authors(self, usernames):
+        missing = [name for name in usernames if name and name not in self.authors]
+        if missing:
+            self.authors.update(Author.objects.filter(user__username__in=missing).values_list('user__username', 'id'))
+
+    def ensure_categories(self, names):
+        missing = [name for name in names if name and name not in self.categories]
+        if missing:
+            Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+            self.categories_created = True
+            self.categories.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+
+    def clean_row(self, row):
+        """
+        Строка с проверенными типами: строковые поля — str (отсутствующие — ''),
+        categories — список непустых строк. Иначе ValueError, и строка пропускается
+        до того, как попадёт в запросы пачки.
+        """
+        if '_error' in row:
+            raise ValueError(row['_error'])
+        cleaned = {}
+        for field in STRING_FIELDS:
+            value = row.get(field)
+            if value is None:
+                value = ''
+            if not isinstance(value, str):
+                raise ValueError(f'{field} должно быть строкой')
+            cleaned[field] = value
+        categories = row.get('categories')
+        if categories is None:
+            categories = []
+        if not isinstance(categories, list) or not all(isinstance(name, str) for name in categories):
+            raise ValueError('categories должно быть списком строк')
+        cleaned['categories'] = [name.strip() for name in categories if name.strip()]
+        cleaned['author'] = cleaned['author'] or self.default_author
+        return cleaned
+
+    def build_post(self, row):
+        title, content = row['title'].strip(), row['content'].strip()
+        if not title or not content:
+            raise ValueError('нет title или content')
+        if len(title) > Post._meta.get_field('title').max_length:
+            raise ValueError('слишком длинный title')
+        post_type = row['post_type'] or Post.NEWS
+        if post_type not in POST_TYPES:
+            raise ValueError(f'неизвестный post_type «{post_type}»')
+        username = row['author']
+        if not username:
+            raise ValueError('нет author и не задан --author')
+        author_id = self.authors.get(username)
+        if author_id is None:
+            raise ValueError(f'автор «{username}» не найден')
+        category_ids = []
+        for name in row['categories']:
+            category_id = self.categories.get(name)
+            if category_id is None:
+                raise ValueError(f'категория «{name}» не найдена')
+            category_ids.append(category_id)
+
+        # title/content пишутся в колонки языка по умолчанию (handle переключает язык)
+        post = Post(
+            author_id=author_id,
+            post_type=post_type,
+            title=title,
+            content=content,
+            title_en=row['title_en'].strip() or None,
+            content_en=row['content_en'].strip() or None,
+        )
+        # bulk_create не вызывает save() — цензура считается здесь
+        for name, value in censored_field_values(post).items():
+            setattr(post, name, value)
+        return post, list(dict.fromkeys(category_ids))
+
+    def finish(self, stats, notify):
+        if stats['imported']:
+            cache.delete_many([count_cache_key(post_type) for post_type in stats['post_types']])
+            bump_tags(
+                *(['categories'] if self.categories_created else []),
+                *(f'posts:{post_type}' for post_type in stats['post_types']),
+                *(f'category:{pk}' for pk in stats['categories']),
+            )
+            refresh_showcase()
+            try:
+                if notify and stats['ids']:
+                    imported_posts_digest.delay(stats['ids'])
+                if settings.TRANSLATE_ON_PUBLISH:
+                    translate_missing_posts.delay()
+            except Exception as e:
+                self.stderr.write(f'Не удалось запустить задачи после импорта: {e}')
+
+        elapsed = stats.get('elapsed') or 0
+        rate = stats['imported'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Импортировано постов: {stats['imported']}, пропущено строк: {stats['skipped']} "
+            f"за {elapsed:.1f} с ({rate:.0f} строк/с)"
+        ))
+        if stats['skipped'] and not stats['imported']:
+            raise CommandError('Ни одна строка не импортирована')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from portal.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает поисковый индекс постов'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Индекс перестроен ({type(backend).__name__})'))
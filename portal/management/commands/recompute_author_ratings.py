@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from portal.models import Author
+from portal.votes import author_ratings
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинги всех авторов сгруппированными запросами (с --check только проверяет)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Только сообщить о расхождениях, ничего не менять')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки для bulk_update')
+
+    def handle(self, *args, **options):
+        ratings = author_ratings()
+
+        changed = []
+        for author in Author.objects.only('id', 'rating').iterator(chunk_size=options['batch_size']):
+            expected = ratings.get(author.id, 0)
+            if author.rating != expected:
+                if options['check']:
+                    self.stdout.write(f'Автор {author.id}: в базе {author.rating}, должно быть {expected}')
+                author.rating = expected
+                changed.append(author)
+
+        if options['check']:
+            style = self.style.WARNING if changed else self.style.SUCCESS
+            self.stdout.write(style(f'Расхождений: {len(changed)}'))
+            return
+
+        Author.objects.bulk_update(changed, ['rating'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Обновлено рейтингов: {len(changed)}'))
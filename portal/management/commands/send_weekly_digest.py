@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from portal.tasks import weekly_digest
+
+
+class Command(BaseCommand):
+    help = 'Отправляет еженедельный дайджест (с --dry-run только считает объём рассылки)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Ничего не отправлять, показать объём рассылки')
+
+    def handle(self, *args, **options):
+        stats = weekly_digest(dry_run=options['dry_run'])
+        mode = 'Пробный запуск' if stats['dry_run'] else 'Отправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode}: писем {stats['emails']}, постов {stats['posts']}, "
+            f"категорий {stats['categories']}, ошибок {stats['failed']}"
+        ))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+from portal import translator
+
+
+class Command(BaseCommand):
+    help = (
+        'Переводит на английский посты без английского заголовка или текста: '
+        'пачками, параллельными запросами и с памятью переводов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help='Перевести не больше стольких постов')
+        parser.add_argument('--chunk-size', type=int, help='Постов в одной пачке сохранения')
+        parser.add_argument('--batch-size', type=int, help='Предложений в одном запросе к сервису')
+        parser.add_argument('--workers', type=int, help='Параллельных запросов к сервису')
+        parser.add_argument('--backend', help='Путь к классу бэкенда вместо settings.TRANSLATION_BACKEND')
+
+    def handle(self, *args, **options):
+        backend = import_string(options['backend'])() if options['backend'] else None
+        pending = translator.untranslated_posts().count()
+        self.stdout.write(f'Постов без перевода: {pending}')
+
+        started = time.perf_counter()
+        translated = translator.translate_posts(
+            limit=options['limit'],
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            backend=backend,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Переведено постов: {translated} за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,192 @@
+import threading
+import time
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates
+
+# Метрики текущего запроса; вне запроса (Celery, команды) — None, и ничего не считается
+_current = ContextVar('request_metrics', default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class RequestMetrics:
+    __slots__ = ('db_queries', 'db_time', 'cache_hits', 'cache_misses', 'template_time', 'template_depth')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def server_timing(self, total):
+        """
+        Значение заголовка Server-Timing (длительности в миллисекундах).
+        """
+        return ', '.join([
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries"',
+            f'cache;desc="hit={self.cache_hits} miss={self.cache_misses}"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+        ])
+
+
+def start():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def db_wrapper(execute, sql, params, many, context):
+    """
+    Обёртка connection.execute_wrapper: число и время запросов к базе.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def record_cache(hits, misses):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+class TimedTemplate:
+    """
+    Шаблон бэкенда с замером render(). Вложенные render() (render_to_string
+    внутри рендера) не суммируются повторно.
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self.template.render(context, request)
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class RouteStats:
+    __slots__ = ('duration', 'queries', 'db_seconds', 'template_seconds', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """
+    Гистограммы по маршрутам в памяти процесса. При нескольких процессах
+    (gunicorn и т.п.) каждый отдаёт свои — Prometheus собирает их по отдельности.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def observe(self, route, method, total, metrics):
+        with self._lock:
+            stats = self._routes.get((route, method))
+            if stats is None:
+                stats = self._routes[(route, method)] = RouteStats()
+            stats.duration.observe(total)
+            stats.queries.observe(metrics.db_queries)
+            stats.db_seconds += metrics.db_time
+            stats.template_seconds += metrics.template_time
+            stats.cache_hits += metrics.cache_hits
+            stats.cache_misses += metrics.cache_misses
+
+    def render(self):
+        """
+        Текстовый формат Prometheus (exposition format 0.0.4).
+        """
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = []
+            for name, attr, help_text in (
+                ('portal_request_duration_seconds', 'duration', 'Время обработки запроса'),
+                ('portal_request_db_queries', 'queries', 'Запросов к базе на один запрос'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (route, method), stats in routes:
+                    histogram = getattr(stats, attr)
+                    labels = f'route="{label_value(route)}",method="{label_value(method)}"'
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+            for name, attr, help_text in (
+                ('portal_request_db_seconds_total', 'db_seconds', 'Суммарное время запросов к базе'),
+                ('portal_request_template_seconds_total', 'template_seconds', 'Суммарное время рендера шаблонов'),
+                ('portal_request_cache_hits_total', 'cache_hits', 'Попадания в кэш'),
+                ('portal_request_cache_misses_total', 'cache_misses', 'Промахи кэша'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for (route, method), stats in routes:
+                    lines.append(f'{name}{{route="{label_value(route)}",method="{label_value(method)}"}} {getattr(stats, attr)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
@@ -1 +0,0 @@
-from .timezone import TimezoneMiddleware
\ No newline at end of file
@@ -1,28 +1,83 @@
+import time
+from contextlib import ExitStack
+from functools import lru_cache
+
 import pytz
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.middleware.locale import LocaleMiddleware
 from django.utils import timezone
-from django.utils import translation
 
+from . import metrics
 
-class ForceLangMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+KNOWN_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
 
-    def __call__(self, request):
-        if 'django_language' in request.session:
-            lang = request.session['django_language']
-            translation.activate(lang)
-            request.LANGUAGE_CODE = lang
-        return self.get_response(request)
 
+class PerformanceMiddleware:
+    """
+    Время запроса, число и время запросов к базе, попадания в кэш и время
+    рендера шаблонов: в заголовок Server-Timing и в гистограммы по маршрутам
+    (portal.metrics.registry, отдаются на /metrics/). Должен стоять первым.
+    """
 
-class TimezoneMiddleware:
     def __init__(self, get_response):
+        if not settings.PERFORMANCE_METRICS:
+            raise MiddlewareNotUsed
         self.get_response = get_response
 
     def __call__(self, request):
-        tzname = request.session.get('django_timezone')
-        if tzname:
-            timezone.activate(pytz.timezone(tzname))
+        request_metrics, token = metrics.start()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(metrics.db_wrapper))
+                response = self.get_response(request)
+        finally:
+            metrics.stop(token)
+        total = time.perf_counter() - started
+
+        response['Server-Timing'] = request_metrics.server_timing(total)
+        match = request.resolver_match
+        # Метка — имя маршрута, а не путь: число рядов в Prometheus остаётся ограниченным
+        route = match.view_name if match else '<unmatched>'
+        method = request.method if request.method in KNOWN_METHODS else 'OTHER'
+        metrics.registry.observe(route, method, total, request_metrics)
+        return response
+
+
+def get_timezone(name):
+    """
+    Объект часового пояса по имени (один на процесс) или None для неизвестного имени.
+    """
+    # Имя проверяется до кэша: произвольные значения cookie не копятся в памяти,
+    # и кэш ограничен числом поясов pytz
+    if name not in pytz.all_timezones_set:
+        return None
+    return _load_timezone(name)
+
+
+@lru_cache(maxsize=None)
+def _load_timezone(name):
+    return pytz.timezone(name)
+
+
+class LocaleTimezoneMiddleware(LocaleMiddleware):
+    """
+    Язык и часовой пояс запроса. Язык — как в LocaleMiddleware: префикс URL,
+    затем cookie языка. Пояс — из cookie TIMEZONE_COOKIE_NAME; сессия читается
+    только у посетителей с cookie сессии (пояс, выбранный до появления cookie),
+    так что анонимные запросы не загружают сессию и не ходят в базу.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        tzname = request.COOKIES.get(settings.TIMEZONE_COOKIE_NAME)
+        if not tzname and settings.SESSION_COOKIE_NAME in request.COOKIES:
+            tzname = request.session.get('django_timezone')
+        tz = get_timezone(tzname) if tzname else None
+        if tz is not None:
+            timezone.activate(tz)
         else:
             timezone.deactivate()
-        return self.get_response(request)
\ No newline at end of file
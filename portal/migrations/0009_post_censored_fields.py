@@ -0,0 +1,140 @@
+# Generated by Django 4.2.20 on 2026-10-18 19:08
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Копия правил portal/censor.py на момент миграции: её результат не должен
+# зависеть от того, как модуль цензуры поменяется потом
+CENSORED_FIELDS = ('title', 'content')
+
+
+def _censor_function(words):
+    words = sorted({word.strip().lower() for word in words if word and word.strip()}, key=len, reverse=True)
+    if not words:
+        return lambda text: text
+    pattern = re.compile(r'\b(?:' + '|'.join(map(re.escape, words)) + r')\b', re.IGNORECASE)
+    return lambda text: pattern.sub(lambda match: match.group()[0] + '*' * (len(match.group()) - 1), text)
+
+
+def fill_censored_fields(apps, schema_editor):
+    censor = _censor_function(settings.CENSOR_BANNED_WORDS)
+    Post = apps.get_model('portal', 'Post')
+    languages = settings.MODELTRANSLATION_LANGUAGES
+    default_language = settings.MODELTRANSLATION_DEFAULT_LANGUAGE
+    names = [f'censored_{field}{suffix}' for field in CENSORED_FIELDS for suffix in ['', *(f'_{lang}' for lang in languages)]]
+
+    batch = []
+    for post in Post.objects.iterator(chunk_size=500):
+        for field in CENSORED_FIELDS:
+            setattr(post, f'censored_{field}', censor(getattr(post, field) or ''))
+            for lang in languages:
+                value = getattr(post, f'{field}_{lang}') or (getattr(post, field) if lang == default_language else '')
+                setattr(post, f'censored_{field}_{lang}', censor(value or ''))
+        batch.append(post)
+        if len(batch) >= 500:
+            Post.objects.bulk_update(batch, names)
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, names)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0008_alter_post_author'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='category',
+            options={'verbose_name': 'Category', 'verbose_name_plural': 'Categories'},
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='name_en',
+            field=models.CharField(max_length=255, null=True, unique=True, verbose_name='Category Name'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='name_ru',
+            field=models.CharField(max_length=255, null=True, unique=True, verbose_name='Category Name'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='censored_content',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='censored_content_en',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='censored_content_ru',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='censored_title',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='censored_title_en',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='censored_title_ru',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='content_en',
+            field=models.TextField(null=True, verbose_name='Content'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='content_ru',
+            field=models.TextField(null=True, verbose_name='Content'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='title_en',
+            field=models.CharField(max_length=255, null=True, verbose_name='Title'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='title_ru',
+            field=models.CharField(max_length=255, null=True, verbose_name='Title'),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=255, unique=True, verbose_name='Category Name'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='categories',
+            field=models.ManyToManyField(through='portal.PostCategory', to='portal.category', verbose_name='Categories'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='content',
+            field=models.TextField(verbose_name='Content'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='post_type',
+            field=models.CharField(choices=[('news', 'News'), ('article', 'Article')], default='news', max_length=7),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='title',
+            field=models.CharField(max_length=255, verbose_name='Title'),
+        ),
+        migrations.RunPython(fill_censored_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations, OperationalError
+
+# Имя и состав индекса на момент миграции (portal/search.py может измениться позже)
+FTS_TABLE = 'portal_post_fts'
+INDEX_SELECT_SQL = """
+    SELECT p.id, COALESCE(p.title_ru, p.title, ''), COALESCE(p.title_en, ''),
+           COALESCE(p.content_ru, p.content, ''), COALESCE(p.content_en, ''),
+           u.username, p.post_type, p.created_at
+    FROM portal_post p
+    INNER JOIN portal_author a ON a.id = p.author_id
+    INNER JOIN auth_user u ON u.id = a.user_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Индекс FTS5 создаётся только на SQLite; на других базах
+    (или без FTS5) поиск использует индекс в памяти.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "title_ru, title_en, content_ru, content_en, author, "
+            "post_type UNINDEXED, created_at UNINDEXED, "
+            "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+        )
+    except OperationalError:
+        return
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE} (rowid, title_ru, title_en, content_ru, content_en, author, post_type, created_at) '
+        f'{INDEX_SELECT_SQL}'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0009_post_censored_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0011_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='timezone',
+            field=models.CharField(blank=True, editable=False, max_length=63),
+        ),
+    ]
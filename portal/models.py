@@ -2,21 +2,27 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
+from .censor import CENSORED_FIELDS, censored_field_values
+from . import votes
 
 class Author(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     rating = models.IntegerField(default=0)
+    # Часовой пояс, выбранный на сайте; по нему считаются сутки лимита публикаций (quota)
+    timezone = models.CharField(max_length=63, blank=True, editable=False)
 
     def __str__(self):
         return self.user.username
 
     def update_rating(self):
-        post_ratings = self.post_set.aggregate(models.Sum('rating'))['rating__sum'] or 0
+        # Обычно рейтинг поддерживается инкрементально (votes.apply_deltas);
+        # полный пересчёт всех авторов — команда recompute_author_ratings
+        post_ratings = self.posts.aggregate(models.Sum('rating'))['rating__sum'] or 0
         comment_ratings = self.user.comment_set.aggregate(models.Sum('rating'))['rating__sum'] or 0
         post_comment_ratings = Comment.objects.filter(post__author=self).aggregate(models.Sum('rating'))['rating__sum'] or 0
 
         self.rating = post_ratings * 3 + comment_ratings + post_comment_ratings
-        self.save()
+        self.save(update_fields=['rating'])
 
 class Category(models.Model):
     name = models.CharField(_("Category Name"), max_length=255, unique=True)
@@ -42,17 +48,52 @@ class Post(models.Model):
     author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name='posts')
     post_type = models.CharField(max_length=7, choices=POST_TYPES, default=NEWS)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Меняется при каждом save(); голоса (votes.apply_deltas) его не трогают
+    updated_at = models.DateTimeField(auto_now=True)
     title = models.CharField(_("Title"), max_length=255)
     content = models.TextField(_("Content"))
+    # Тексты после цензуры считаются при сохранении, шаблоны выводят их как есть
+    censored_title = models.CharField(max_length=255, blank=True, editable=False)
+    censored_content = models.TextField(blank=True, editable=False)
     rating = models.IntegerField(default=0)
+    # Число комментариев; поддерживается UPDATE ... F() из сигналов Comment (signals.py)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Ленты и API: post_type = ... ORDER BY -created_at, -id (в т.ч. курсорная пагинация)
+            models.Index(fields=['post_type', '-created_at', '-id'], name='post_type_created_idx'),
+            # Лимит новостей: author + post_type + диапазон created_at
+            models.Index(fields=['author', 'post_type', 'created_at'], name='post_author_type_created_idx'),
+            # Дайджест: посты за неделю
+            models.Index(fields=['created_at'], name='post_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Тип на момент загрузки: при его смене сигнал сбрасывает счётчики обоих типов
+        instance._loaded_post_type = instance.__dict__.get('post_type')
+        return instance
+
+    def save(self, *args, **kwargs):
+        censored = censored_field_values(self)
+        for name, value in censored.items():
+            setattr(self, name, value)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if any(name.startswith(CENSORED_FIELDS) for name in update_fields):
+                update_fields.update(censored)
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
 
     def like(self):
-        self.rating += 1
-        self.save()
+        votes.vote(self, 1)
 
     def dislike(self):
-        self.rating -= 1
-        self.save()
+        votes.vote(self, -1)
 
     def preview(self):
         return self.content[:124] + '...' if len(self.content) > 124 else self.content
@@ -67,6 +108,12 @@ class PostCategory(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            # Посты категории (дайджест, ленты категорий) без обращения к таблице
+            models.Index(fields=['category', 'post'], name='postcategory_category_post_idx'),
+        ]
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -74,16 +121,40 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     rating = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # Комментарии поста: курсорная пагинация по (created_at, id)
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_idx'),
+        ]
+
     def like(self):
-        self.rating += 1
-        self.save()
+        votes.vote(self, 1)
 
     def dislike(self):
-        self.rating -= 1
-        self.save()
+        votes.vote(self, -1)
 
 class Subscription(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+
+class TranslationMemory(models.Model):
+    """
+    Память переводов: однажды переведённое предложение больше не отправляется
+    в сервис перевода (portal/translator.py).
+    """
+    source_hash = models.CharField(max_length=64)
+    source_language = models.CharField(max_length=10)
+    target_language = models.CharField(max_length=10)
+    source_text = models.TextField()
+    translated_text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source_hash', 'source_language', 'target_language'],
+                name='translation_memory_unique_source',
+            ),
+        ]
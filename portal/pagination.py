@@ -0,0 +1,261 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+CURSOR_PARAM = 'cursor'
+COUNT_CACHE_TIMEOUT = 60 * 5
+
+
+def count_cache_key(post_type):
+    return f'post_count_{post_type}'
+
+
+def cached_count(queryset, key, timeout=COUNT_CACHE_TIMEOUT):
+    """
+    Общее количество записей берём из кэша: COUNT(*) выполняется
+    только после инвалидации (см. signals.py) или истечения таймаута.
+    """
+    return cache.get_or_set(key, queryset.count, timeout)
+
+
+def estimated_count(model, using='default'):
+    """
+    Оценка числа строк таблицы из статистики базы (без COUNT(*)):
+    pg_class.reltuples на PostgreSQL, sqlite_stat1 (после ANALYZE) на SQLite.
+    None — оценки нет.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            elif connection.vendor == 'sqlite':
+                # Первое число stat — строк в таблице (для любого её индекса)
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None:
+        return None
+    value = int(str(row[0]).split()[0])
+    return value if value >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator для списков админки: без фильтров и поиска число строк большой
+    таблицы (больше settings.ADMIN_ESTIMATED_COUNT_THRESHOLD) берётся из
+    статистики базы, иначе — обычный COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+def cursor_enabled(request):
+    """
+    Курсорный режим включается настройкой POSTS_CURSOR_PAGINATION
+    или явно — наличием параметра ?cursor= в запросе.
+    """
+    params = getattr(request, 'query_params', request.GET)
+    return getattr(settings, 'POSTS_CURSOR_PAGINATION', False) or CURSOR_PARAM in params
+
+
+def encode_cursor(post, reverse=False):
+    raw = f"{'b' if reverse else 'f'}|{post.created_at.isoformat()}|{post.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """
+    Возвращает (reverse, created_at, id) или None для пустого/битого курсора.
+    """
+    if not value:
+        return None
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        direction, created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    if direction not in ('f', 'b') or created_at is None:
+        return None
+    return direction == 'b', created_at, pk
+
+
+class KeysetPaginator:
+    """
+    Пагинация по ключу (created_at, id) вместо OFFSET: любая страница
+    стоит столько же, сколько первая. Queryset должен быть отфильтрован,
+    но не отсортирован — порядок (-created_at, -id) задаётся здесь.
+    """
+
+    def __init__(self, queryset, per_page, count_key=None, count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count_key = count_key
+        # Уже известное число записей (например, Post.comment_count) — без COUNT(*)
+        self._count = count
+
+    @property
+    def count(self):
+        if self._count is not None:
+            return self._count
+        if self.count_key is None:
+            return self.queryset.count()
+        return cached_count(self.queryset, self.count_key)
+
+    def get_page(self, cursor):
+        position = decode_cursor(cursor)
+        queryset = self.queryset.order_by('-created_at', '-id')
+
+        if position is None:
+            rows = list(queryset[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            return KeysetPage(rows[:self.per_page], self, has_next=has_next, has_previous=False)
+
+        reverse, created_at, pk = position
+        if reverse:
+            rows = list(
+                self.queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+                .order_by('created_at', 'id')[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return KeysetPage(rows, self, has_next=True, has_previous=has_previous)
+
+        rows = list(
+            queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+            [:self.per_page + 1]
+        )
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], self, has_next=has_next, has_previous=True)
+
+
+class KeysetPage:
+    """
+    Аналог django.core.paginator.Page для шаблонов: вместо номеров
+    страниц отдаёт курсоры на соседние страницы.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous and bool(object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1]) if self._has_next else None
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0], reverse=True) if self._has_previous else None
+
+
+class PostPagination(PageNumberPagination):
+    """
+    Пагинация API: по умолчанию постраничная, как раньше,
+    в курсорном режиме — по ключу (created_at, id).
+    """
+    cursor_query_param = CURSOR_PARAM
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page = None
+        if not cursor_enabled(request):
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor and decode_cursor(cursor) is None:
+            raise NotFound('Invalid cursor')
+
+        count_key = None
+        if view is not None and getattr(view, 'post_type', None):
+            count_key = count_cache_key(view.post_type)
+        self.keyset_page = KeysetPaginator(queryset, self.get_page_size(request), count_key).get_page(cursor)
+        return list(self.keyset_page)
+
+    def get_paginated_response(self, data):
+        if self.page is not None:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.keyset_page.paginator.count,
+            'next': self._cursor_link(self.keyset_page.next_cursor),
+            'previous': self._cursor_link(self.keyset_page.previous_cursor),
+            'results': data,
+        })
+
+    def _cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+
+class CommentPagination(PostPagination):
+    """
+    Комментарии поста — всегда по курсору (created_at, id); общее число
+    берётся из Post.comment_count (view.comment_total).
+    """
+    page_size = settings.COMMENTS_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page = None
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor and decode_cursor(cursor) is None:
+            raise NotFound('Invalid cursor')
+        count = getattr(view, 'comment_total', None)
+        self.keyset_page = KeysetPaginator(queryset, self.get_page_size(request), count=count).get_page(cursor)
+        return list(self.keyset_page)
+
+
+def paginate_posts(request, queryset, per_page, post_type):
+    """
+    Страница для HTML-списков: классический Paginator или курсорная
+    страница — в зависимости от cursor_enabled().
+    """
+    if cursor_enabled(request):
+        paginator = KeysetPaginator(queryset, per_page, count_cache_key(post_type))
+        return paginator.get_page(request.GET.get(CURSOR_PARAM))
+
+    paginator = Paginator(queryset.order_by('-created_at', '-id'), per_page)
+    return paginator.get_page(request.GET.get('page'))
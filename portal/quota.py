@@ -0,0 +1,88 @@
+from datetime import datetime, time, timedelta
+
+import pytz
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+QUOTA_KEY_PREFIX = 'news_quota'
+
+
+def author_timezone(author):
+    """
+    Часовой пояс автора (Author.timezone); если он не выбран — текущий
+    активный пояс запроса.
+    """
+    if author.timezone:
+        try:
+            return pytz.timezone(author.timezone)
+        except pytz.UnknownTimeZoneError:
+            pass
+    return timezone.get_current_timezone()
+
+
+def day_window(author, moment=None):
+    """
+    Границы суток автора, в которые попадает moment: [начало, конец).
+    """
+    tz = author_timezone(author)
+    day = timezone.localtime(moment or timezone.now(), tz).date()
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def _key(author, start):
+    # Ключ — по моменту начала суток: смена пояса даёт новый счётчик, засеянный из базы
+    return f'{QUOTA_KEY_PREFIX}:{author.pk}:{int(start.timestamp())}'
+
+
+def _count_in_db(author, start, end):
+    from .models import Post
+    # Диапазон по created_at, а не created_at__date: так работает индекс
+    return Post.objects.filter(
+        author=author,
+        post_type='news',
+        created_at__gte=start,
+        created_at__lt=end,
+    ).count()
+
+
+def _ensure_counter(author, start, end):
+    key = _key(author, start)
+    # add атомарен: из параллельных запросов засеет счётчик только один.
+    # Таймаут ограничивает расхождение с базой (посты, созданные мимо сервиса)
+    cache.add(key, _count_in_db(author, start, end), settings.NEWS_QUOTA_SYNC_TIMEOUT)
+    return key
+
+
+def consume(author):
+    """
+    Резервирует одну новость из суточного лимита. Возвращает False,
+    если лимит исчерпан. Проверка — один атомарный incr в кэше.
+    """
+    start, end = day_window(author)
+    key = _ensure_counter(author, start, end)
+    try:
+        used = cache.incr(key)
+    except ValueError:
+        # Счётчик истёк между add и incr
+        key = _ensure_counter(author, start, end)
+        used = cache.incr(key)
+    if used > settings.NEWS_DAILY_LIMIT:
+        cache.decr(key)
+        return False
+    return True
+
+
+def release(author, created_at=None):
+    """
+    Возвращает новость в лимит: публикация не состоялась или новость удалена.
+    """
+    start, _ = day_window(author, created_at)
+    try:
+        cache.decr(_key(author, start))
+    except ValueError:
+        # Счётчика нет — при следующей проверке он засеется из базы
+        pass
+
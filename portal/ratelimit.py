@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+RATE_KEY_PREFIX = 'rate_limit'
+
+
+def hit(scope, ident, limit, period):
+    """
+    Засчитывает действие ident в окне period секунд (фиксированное окно)
+    и возвращает True, если лимит limit ещё не превышен. Счётчик — incr
+    в Redis (COUNTERS кэша), поэтому лимит общий для всех процессов.
+    """
+    window = int(time.time() // period)
+    key = f'{RATE_KEY_PREFIX}:{scope}:{ident}:{window}'
+    cache.add(key, 0, period)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Ключ истёк между add и incr
+        cache.set(key, 1, period)
+        count = 1
+    return count <= limit
+
+
+def comment_allowed(user):
+    return hit('comment', user.pk, settings.COMMENT_RATE_LIMIT, settings.COMMENT_RATE_PERIOD)
@@ -0,0 +1,335 @@
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+FTS_TABLE = 'portal_post_fts'
+# Счётчик изменений индекса в общем кэше — по нему PythonIndexBackend замечает чужие изменения
+INDEX_VERSION_KEY = 'search_index:version'
+TOKEN_RE = re.compile(r'\w+')
+
+SearchResult = namedtuple('SearchResult', ['ids', 'total'])
+
+# Вес совпадения по полям: заголовок важнее текста, автор — между ними
+FIELD_WEIGHTS = {
+    'title_ru': 10.0,
+    'title_en': 10.0,
+    'content_ru': 1.0,
+    'content_en': 1.0,
+    'author': 5.0,
+}
+TEXT_FIELDS = ('title_ru', 'title_en', 'content_ru', 'content_en')
+
+# Одна и та же выборка используется для индексации одного поста и полной перестройки
+INDEX_SELECT_SQL = """
+    SELECT p.id, COALESCE(p.title_ru, p.title, ''), COALESCE(p.title_en, ''),
+           COALESCE(p.content_ru, p.content, ''), COALESCE(p.content_en, ''),
+           u.username, p.post_type, p.created_at
+    FROM portal_post p
+    INNER JOIN portal_author a ON a.id = p.author_id
+    INNER JOIN auth_user u ON u.id = a.user_id
+"""
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def _date_bound(value):
+    """
+    Дата из формы поиска -> значение для сравнения с created_at
+    (полночь в текущем часовом поясе, как у DateFilter).
+    """
+    moment = timezone.make_aware(datetime.combine(value, time.min))
+    return connection.ops.adapt_datetimefield_value(moment)
+
+
+class BaseSearchBackend:
+    """
+    Интерфейс поискового бэкенда. Индекс ведётся по заголовку и тексту
+    на обоих языках modeltranslation и по имени автора.
+    """
+
+    def index_post(self, post):
+        raise NotImplementedError
+
+    def remove_post(self, post_id):
+        raise NotImplementedError
+
+    def index_author(self, author_id):
+        """
+        Переиндексация постов автора — имя пользователя входит в индекс.
+        """
+        from .models import Post
+        for post in Post.objects.filter(author_id=author_id).only('id').iterator():
+            self.index_post(post)
+
+    def rebuild(self):
+        raise NotImplementedError
+
+    def search(self, text='', author='', date_from=None, post_type='news', offset=0, limit=10):
+        """
+        Возвращает SearchResult: id постов по убыванию релевантности
+        (не больше limit) и общее число найденных.
+        """
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    Полнотекстовый индекс FTS5 в основной базе SQLite
+    (таблица создаётся миграцией 0010_post_search_index).
+    """
+
+    @staticmethod
+    def is_available():
+        return connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+
+    def index_post(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title_ru, title_en, content_ru, content_en, author, post_type, created_at) '
+                f'{INDEX_SELECT_SQL} WHERE p.id = %s',
+                [post.pk],
+            )
+
+    def remove_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+    def index_author(self, author_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {FTS_TABLE} SET author = ('
+                f'SELECT u.username FROM portal_author a INNER JOIN auth_user u ON u.id = a.user_id WHERE a.id = %s'
+                f') WHERE rowid IN (SELECT id FROM portal_post WHERE author_id = %s)',
+                [author_id, author_id],
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title_ru, title_en, content_ru, content_en, author, post_type, created_at) '
+                f'{INDEX_SELECT_SQL}'
+            )
+
+    @staticmethod
+    def _match_expression(columns, text):
+        tokens = tokenize(text)
+        if not tokens:
+            return None
+        terms = ' AND '.join(f'"{token}"*' for token in tokens)
+        return f"{{{' '.join(columns)}}} : ({terms})"
+
+    def search(self, text='', author='', date_from=None, post_type='news', offset=0, limit=10):
+        expressions = [
+            expression for expression in (
+                self._match_expression(TEXT_FIELDS, text),
+                self._match_expression(('author',), author),
+            ) if expression
+        ]
+        if not expressions:
+            return SearchResult([], 0)
+
+        where = f'{FTS_TABLE} MATCH %s AND post_type = %s'
+        params = [' AND '.join(expressions), post_type]
+        if date_from:
+            where += ' AND created_at >= %s'
+            params.append(_date_bound(date_from))
+
+        weights = ', '.join(str(weight) for weight in FIELD_WEIGHTS.values())
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE} WHERE {where}', params)
+            total = cursor.fetchone()[0]
+            if not total:
+                return SearchResult([], 0)
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {where} '
+                f'ORDER BY bm25({FTS_TABLE}, {weights}, 0, 0) LIMIT %s OFFSET %s',
+                params + [limit, offset],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        return SearchResult(ids, total)
+
+
+class PythonIndexBackend(BaseSearchBackend):
+    """
+    Запасной вариант без FTS: инвертированный индекс в памяти процесса.
+    Строится при первом поиске и дальше обновляется из сигналов Post.
+    Каждое изменение сдвигает счётчик INDEX_VERSION_KEY в общем кэше; если
+    его сдвинул другой процесс, индекс перед поиском строится заново.
+    Перестройка читает все посты, поэтому при нескольких процессах с частой
+    записью бэкенд годится только для небольших баз — иначе нужен FTS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._version = None  # значение счётчика, которому соответствует индекс
+        self._postings = defaultdict(lambda: defaultdict(dict))  # поле -> токен -> {id: tf}
+        self._terms = defaultdict(list)  # поле -> отсортированные токены (для поиска по префиксу)
+        self._docs = {}  # id -> (post_type, created_at, {поле: токены})
+
+    def _add(self, row):
+        post_id, title_ru, title_en, content_ru, content_en, author, post_type, created_at = row
+        fields = dict(zip(FIELD_WEIGHTS, (title_ru, title_en, content_ru, content_en, author)))
+        tokens = {}
+        for field, value in fields.items():
+            counts = defaultdict(int)
+            for token in tokenize(value):
+                counts[token] += 1
+            tokens[field] = set(counts)
+            for token, count in counts.items():
+                posting = self._postings[field][token]
+                if not posting:
+                    self._insert_term(field, token)
+                posting[post_id] = count
+        self._docs[post_id] = (post_type, str(created_at), tokens)
+
+    def _insert_term(self, field, token):
+        terms = self._terms[field]
+        index = bisect_left(terms, token)
+        if index == len(terms) or terms[index] != token:
+            terms.insert(index, token)
+
+    def _remove(self, post_id):
+        doc = self._docs.pop(post_id, None)
+        if doc is None:
+            return
+        for field, tokens in doc[2].items():
+            for token in tokens:
+                self._postings[field][token].pop(post_id, None)
+
+    def _fetch(self, where='', params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'{INDEX_SELECT_SQL} {where}', list(params))
+            return cursor.fetchall()
+
+    def _next_version(self):
+        cache.add(INDEX_VERSION_KEY, 0, None)
+        try:
+            return cache.incr(INDEX_VERSION_KEY)
+        except ValueError:
+            return None
+
+    def _update(self, post_ids, rows):
+        """
+        Заменяет в индексе посты post_ids строками rows и сдвигает счётчик.
+        Если между нашими изменениями его сдвигал кто-то ещё, индекс
+        помечается устаревшим и перестроится при следующем поиске.
+        """
+        version = self._next_version()
+        with self._lock:
+            if not self._built:
+                return
+            for post_id in post_ids:
+                self._remove(post_id)
+            for row in rows:
+                self._add(row)
+            if version is not None and self._version is not None and version == self._version + 1:
+                self._version = version
+            else:
+                self._built = False
+
+    def index_post(self, post):
+        self._update([post.pk], self._fetch('WHERE p.id = %s', [post.pk]) if self._built else [])
+
+    def remove_post(self, post_id):
+        self._update([post_id], [])
+
+    def index_author(self, author_id):
+        rows = self._fetch('WHERE p.author_id = %s', [author_id]) if self._built else []
+        self._update([row[0] for row in rows], rows)
+
+    def rebuild(self):
+        # Счётчик — до чтения постов: изменения во время чтения вызовут ещё одну перестройку
+        version = cache.get(INDEX_VERSION_KEY, 0)
+        rows = self._fetch()
+        with self._lock:
+            self._postings.clear()
+            self._terms.clear()
+            self._docs.clear()
+            for row in rows:
+                self._add(row)
+            self._built = True
+            self._version = version
+
+    def _ensure_built(self):
+        if not self._built or cache.get(INDEX_VERSION_KEY, 0) != self._version:
+            self.rebuild()
+
+    def _match(self, fields, token):
+        """
+        {id: вклад в релевантность} для токена как префикса в заданных полях.
+        """
+        scores = defaultdict(float)
+        total_docs = len(self._docs) or 1
+        for field in fields:
+            terms = self._terms[field]
+            index = bisect_left(terms, token)
+            while index < len(terms) and terms[index].startswith(token):
+                posting = self._postings[field][terms[index]]
+                if posting:
+                    idf = math.log(1 + total_docs / len(posting))
+                    for post_id, count in posting.items():
+                        scores[post_id] += FIELD_WEIGHTS[field] * count * idf
+                index += 1
+        return scores
+
+    def search(self, text='', author='', date_from=None, post_type='news', offset=0, limit=10):
+        queries = [(TEXT_FIELDS, token) for token in tokenize(text)]
+        queries += [(('author',), token) for token in tokenize(author)]
+        if not queries:
+            return SearchResult([], 0)
+
+        self._ensure_built()
+        date_bound = str(_date_bound(date_from)) if date_from else None
+        with self._lock:
+            scores = None
+            for fields, token in queries:
+                matched = self._match(fields, token)
+                if scores is None:
+                    scores = matched
+                else:
+                    scores = {post_id: scores[post_id] + score for post_id, score in matched.items() if post_id in scores}
+                if not scores:
+                    return SearchResult([], 0)
+
+            ranked = []
+            for post_id, score in scores.items():
+                doc_type, created_at, _ = self._docs[post_id]
+                if doc_type != post_type or (date_bound and created_at < date_bound):
+                    continue
+                ranked.append((-score, post_id))
+        ranked.sort()
+        return SearchResult([post_id for _, post_id in ranked[offset:offset + limit]], len(ranked))
+
+
+_backend = None
+
+
+def get_backend():
+    """
+    Бэкенд из settings.SEARCH_BACKEND; по умолчанию FTS5, если таблица
+    индекса есть в базе, иначе индекс в памяти.
+    """
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif SQLiteFTSBackend.is_available():
+            _backend = SQLiteFTSBackend()
+        else:
+            _backend = PythonIndexBackend()
+    return _backend
@@ -1,5 +1,9 @@
+from collections import defaultdict
+
+from django.conf import settings
+from modeltranslation.utils import get_language, resolution_order
 from rest_framework import serializers
-from .models import Post
+from .models import Comment, Post, PostCategory
 
 
 class PostSerializer(serializers.ModelSerializer):
@@ -14,6 +18,69 @@ class PostSerializer(serializers.ModelSerializer):
             'created_at',
             'author',
             'post_type',
-            'categories'
+            'categories',
+            'comment_count',
         ]
-        read_only_fields = ['created_at', 'author', 'post_type']
\ No newline at end of file
+        read_only_fields = ['created_at', 'author', 'post_type', 'comment_count']
+
+
+class CommentSerializer(serializers.ModelSerializer):
+    user = serializers.ReadOnlyField(source='user.username')
+
+    class Meta:
+        model = Comment
+        fields = ['id', 'post', 'user', 'text', 'created_at', 'rating']
+        read_only_fields = ['post', 'created_at', 'rating']
+
+
+TRANSLATED_FIELDS = ('title', 'content')
+_created_at_field = serializers.DateTimeField()
+
+
+def _translated(row, field, languages):
+    # Та же логика, что у дескриптора modeltranslation: первый непустой перевод
+    for lang in languages:
+        value = row[f'{field}_{lang}']
+        if value is not None and value != '':
+            return value
+    return ''
+
+
+def serialize_posts(queryset, ids=None):
+    """
+    Быстрый путь чтения для API: строки собираются из values() и одного
+    запроса за категориями, без экземпляров моделей и ModelSerializer.
+    Формат совпадает с PostSerializer. Если переданы ids, строки
+    возвращаются в их порядке.
+    """
+    fields = ['id', 'created_at', 'post_type', 'author__user__username', 'comment_count']
+    fields += [f'{field}_{lang}' for field in TRANSLATED_FIELDS for lang in settings.MODELTRANSLATION_LANGUAGES]
+    rows = {row['id']: row for row in queryset.values(*fields)}
+    if not rows:
+        return []
+
+    # Порядок связей (по id) восстанавливаем в Python: ORDER BY поверх IN по post_id
+    # требовал сортировки во временном B-дереве
+    categories = defaultdict(list)
+    for _, post_id, category_id in sorted(
+        PostCategory.objects.filter(post_id__in=list(rows)).order_by().values_list('id', 'post_id', 'category_id')
+    ):
+        categories[post_id].append(category_id)
+
+    languages = resolution_order(get_language())
+    data = []
+    for pk in (rows if ids is None else ids):
+        row = rows.get(pk)
+        if row is None:
+            continue
+        data.append({
+            'id': pk,
+            'title': _translated(row, 'title', languages),
+            'content': _translated(row, 'content', languages),
+            'created_at': _created_at_field.to_representation(row['created_at']),
+            'author': row['author__user__username'],
+            'post_type': row['post_type'],
+            'categories': categories[pk],
+            'comment_count': row['comment_count'],
+        })
+    return data
@@ -0,0 +1,74 @@
+from django.core.cache import cache
+from django.utils import translation
+
+from .caching import bump_tags
+from .censor import CENSORED_FIELDS
+
+# Первые SHOWCASE_SIZE новостей показываются англоязычным читателям в переводе
+SHOWCASE_SIZE = 5
+SHOWCASE_LANGUAGE = 'en'
+SHOWCASE_CACHE_KEY = 'translated_showcase_ids'
+SHOWCASE_TAG = 'showcase'
+
+
+def _query_showcase_ids():
+    from .models import Post
+    return list(
+        Post.objects.filter(post_type='news')
+        .order_by('-created_at', '-id')
+        .values_list('id', flat=True)[:SHOWCASE_SIZE]
+    )
+
+
+def showcase_ids():
+    """
+    id новостей витрины переводов. Хранятся в кэше без таймаута
+    и обновляются из сигналов Post (refresh_showcase).
+    """
+    ids = cache.get(SHOWCASE_CACHE_KEY)
+    if ids is None:
+        ids = _query_showcase_ids()
+        cache.set(SHOWCASE_CACHE_KEY, ids, None)
+    return frozenset(ids)
+
+
+def refresh_showcase():
+    """
+    Пересчитывает витрину; если состав изменился, инвалидирует
+    зависящие от неё страницы по тегу SHOWCASE_TAG.
+    """
+    old_ids = cache.get(SHOWCASE_CACHE_KEY)
+    new_ids = _query_showcase_ids()
+    cache.set(SHOWCASE_CACHE_KEY, new_ids, None)
+    if old_ids is None or set(old_ids) != set(new_ids):
+        bump_tags(SHOWCASE_TAG)
+
+
+def uses_showcase(language=None):
+    return (language or translation.get_language()) == SHOWCASE_LANGUAGE
+
+
+def localize_post(post, language=None, ids=None):
+    """
+    Правило подстановки перевода: для английского языка новости
+    из витрины выводятся в английской версии (если она заполнена).
+    """
+    if not uses_showcase(language):
+        return post
+    if post.pk not in (showcase_ids() if ids is None else ids):
+        return post
+    for field in CENSORED_FIELDS:
+        for name in (field, f'censored_{field}'):
+            translated = getattr(post, f'{name}_{SHOWCASE_LANGUAGE}')
+            if translated:
+                setattr(post, name, translated)
+    return post
+
+
+def localize_posts(posts, language=None):
+    if not uses_showcase(language):
+        return posts
+    ids = showcase_ids()
+    for post in posts:
+        localize_post(post, language, ids)
+    return posts
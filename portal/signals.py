@@ -1,14 +1,23 @@
 import logging
+from datetime import timedelta
 from allauth.account.signals import email_confirmed
 from django.conf import settings
 from django.contrib.auth.models import Group, User
 from django.core.mail import EmailMultiAlternatives
 from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.db import transaction
+from django.db.models import F, QuerySet
 from django.dispatch import receiver
 from django.template.loader import render_to_string
 from django.core.cache import cache
-from .models import Post, Author
-from .tasks import new_post_notification
+from django.utils import timezone
+from .models import Post, Author, Category, Comment, PostCategory
+from . import quota, votes
+from .caching import bump_tags, post_tags
+from .search import get_backend as get_search_backend
+from .showcase import refresh_showcase, showcase_ids
+from .pagination import count_cache_key
+from .tasks import new_post_notification, translate_post
 from rest_framework.authtoken.models import Token
 
 logger = logging.getLogger(__name__)
@@ -30,6 +39,19 @@ def send_welcome_after_confirm(request, email_address, **kwargs):
     except Exception as e:
         logger.error(f"Ошибка отправки приветственного письма: {e}")
 
+@receiver(post_delete, sender=Post)
+def release_quota_on_delete(sender, instance, **kwargs):
+    """
+    Удалённая сегодняшняя новость освобождает место в суточном лимите автора
+    """
+    # Старше двух суток новость не попадает в текущие сутки ни в одном поясе —
+    # автора для неё не загружаем
+    if instance.post_type == 'news' and instance.created_at >= timezone.now() - timedelta(days=2):
+        try:
+            quota.release(instance.author, instance.created_at)
+        except Exception as e:
+            logger.error(f"Ошибка обновления лимита новостей: {e}")
+
 @receiver(m2m_changed, sender=Post.categories.through)
 def notify_subscribers_on_category_add(sender, instance, action, **kwargs):
     """
@@ -67,14 +89,18 @@ def add_user_to_common_group(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Post)
 def invalidate_cache_on_save(sender, instance, created, **kwargs):
     """
-    Очистка кэша при создании или обновлении поста
+    Инвалидация кэша страниц при создании или обновлении поста
     """
     try:
-        if instance.post_type == 'news':
-            cache.delete('news_list')
-        if instance.post_type == 'article':
-            cache.delete('article_list')
-        cache.delete(f'post_{instance.id}')
+        old_type = getattr(instance, '_loaded_post_type', None)
+        # Смена типа переносит пост из одного списка в другой: меняются оба счётчика и оба списка
+        moved = not created and old_type is not None and old_type != instance.post_type
+        if created or moved:
+            cache.delete_many([count_cache_key(post_type) for post_type in {instance.post_type, old_type} if post_type])
+        bump_tags(*post_tags(instance), *([f'posts:{old_type}'] if moved else []))
+        instance._loaded_post_type = instance.post_type
+        if instance.post_type == 'news' or instance.pk in showcase_ids():
+            refresh_showcase()
         logger.debug(f"Кэш очищен для поста {instance.id}")
     except Exception as e:
         logger.error(f"Ошибка очистки кэша: {e}")
@@ -82,18 +108,152 @@ def invalidate_cache_on_save(sender, instance, created, **kwargs):
 @receiver(post_delete, sender=Post)
 def invalidate_cache_on_delete(sender, instance, **kwargs):
     """
-    Очистка кэша при удалении поста
+    Инвалидация кэша страниц при удалении поста
     """
     try:
-        if instance.post_type == 'news':
-            cache.delete('news_list')
-        if instance.post_type == 'article':
-            cache.delete('article_list')
-        cache.delete(f'post_{instance.id}')
+        cache.delete(count_cache_key(instance.post_type))
+        bump_tags(*post_tags(instance))
+        if instance.pk in showcase_ids():
+            refresh_showcase()
         logger.debug(f"Кэш очищен для удаленного поста {instance.id}")
     except Exception as e:
         logger.error(f"Ошибка очистки кэша: {e}")
 
+@receiver(m2m_changed, sender=Post.categories.through)
+def invalidate_cache_on_categories_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Изменение связей пост—категория через post.categories / category.post_set
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    try:
+        if reverse:
+            posts = Post.objects.filter(pk__in=pk_set) if pk_set else []
+            bump_tags(f'category:{instance.pk}', *{tag for post in posts for tag in post_tags(post)})
+        else:
+            bump_tags(*post_tags(instance), *(f'category:{pk}' for pk in pk_set or ()))
+    except Exception as e:
+        logger.error(f"Ошибка очистки кэша: {e}")
+
+@receiver(post_save, sender=PostCategory)
+@receiver(post_delete, sender=PostCategory)
+def invalidate_cache_on_post_category(sender, instance, **kwargs):
+    """
+    Прямые изменения PostCategory (например, inline в админке) m2m_changed не шлют
+    """
+    try:
+        bump_tags(*post_tags(instance.post), f'category:{instance.category_id}')
+    except Exception as e:
+        logger.error(f"Ошибка очистки кэша: {e}")
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_cache_on_category(sender, instance, **kwargs):
+    try:
+        bump_tags('categories', f'category:{instance.pk}')
+    except Exception as e:
+        logger.error(f"Ошибка очистки кэша: {e}")
+
+def _comment_post_type(comment):
+    # Пост обычно уже загружен (создание из view); при каскадном удалении — один запрос
+    if Comment.post.is_cached(comment):
+        return comment.post.post_type
+    return Post.objects.filter(pk=comment.post_id).values_list('post_type', flat=True).first()
+
+def _change_comment_count(comment, delta):
+    """
+    Post.comment_count — атомарным UPDATE без save(): не трогает updated_at
+    и не запускает сигналы поста. Списки и страница поста показывают
+    счётчик, поэтому сдвигаются и их теги кэша.
+    """
+    try:
+        posts = Post.objects.filter(pk=comment.post_id)
+        if delta < 0:
+            # Комментарии, созданные bulk_create, в счётчик не попали — ниже нуля не уходим
+            posts = posts.filter(comment_count__gt=0)
+        posts.update(comment_count=F('comment_count') + delta)
+        post_type = _comment_post_type(comment)
+        if post_type is not None:
+            bump_tags(f'posts:{post_type}', f'post:{comment.post_id}')
+    except Exception as e:
+        logger.error(f"Ошибка обновления счётчика комментариев поста {comment.post_id}: {e}")
+
+@receiver(post_save, sender=Comment)
+def update_post_on_comment_save(sender, instance, created, **kwargs):
+    if created:
+        _change_comment_count(instance, 1)
+        return
+    # Правленый комментарий виден только на странице поста и в списке его комментариев
+    try:
+        bump_tags(f'post:{instance.post_id}')
+    except Exception as e:
+        logger.error(f"Ошибка очистки кэша: {e}")
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, origin=None, **kwargs):
+    # Каскад от удаления поста: счётчик удаляемого поста не нужен, а его теги сдвигает invalidate_cache_on_delete
+    if isinstance(origin, Post) or (isinstance(origin, QuerySet) and origin.model is Post):
+        return
+    _change_comment_count(instance, -1)
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def withdraw_rating_on_delete(sender, instance, **kwargs):
+    """
+    Рейтинг автора поддерживается инкрементально — вклад удалённого поста
+    или комментария снимается
+    """
+    try:
+        votes.withdraw_deleted(instance)
+    except Exception as e:
+        logger.error(f"Ошибка обновления рейтинга авторов: {e}")
+
+@receiver(post_save, sender=Post)
+def update_search_index_on_save(sender, instance, **kwargs):
+    try:
+        get_search_backend().index_post(instance)
+    except Exception as e:
+        logger.error(f"Ошибка обновления поискового индекса для поста {instance.id}: {e}")
+
+@receiver(post_save, sender=User)
+def update_search_index_on_rename(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Имя пользователя входит в индекс его постов. Сохранения только других
+    полей (например, last_login при входе) индекс не трогают.
+    """
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    try:
+        author_id = Author.objects.filter(user=instance).values_list('id', flat=True).first()
+        if author_id is not None:
+            get_search_backend().index_author(author_id)
+    except Exception as e:
+        logger.error(f"Ошибка обновления поискового индекса для автора {instance.username}: {e}")
+
+@receiver(post_save, sender=Post)
+def translate_on_publish(sender, instance, created, **kwargs):
+    """
+    Новый пост переводится в фоне после коммита транзакции
+    """
+    if not created or not settings.TRANSLATE_ON_PUBLISH:
+        return
+    post_id = instance.pk
+
+    def schedule():
+        try:
+            translate_post.delay(post_id)
+        except Exception as e:
+            logger.error(f"Ошибка запуска перевода поста {post_id}: {e}")
+
+    transaction.on_commit(schedule)
+
+@receiver(post_delete, sender=Post)
+def update_search_index_on_delete(sender, instance, **kwargs):
+    try:
+        get_search_backend().remove_post(instance.pk)
+    except Exception as e:
+        logger.error(f"Ошибка обновления поискового индекса для поста {instance.id}: {e}")
+
 @receiver(post_save, sender=Post)
 def test_signal(sender, instance, created, **kwargs):
     if created:
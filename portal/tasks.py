@@ -1,64 +1,189 @@
 from django.utils import timezone
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.cache import cache
+from django.contrib.auth.models import User
 from django.template.loader import render_to_string
 from django.contrib.sites.models import Site
 from celery import shared_task
-from .models import Category, Post
+from .models import Category, Post, PostCategory
+from .votes import flush_buffer
+from . import translator
 from django_apscheduler.models import DjangoJobExecution
 from django.conf import settings
 import logging
+from collections import defaultdict
+from itertools import groupby
 
 logger = logging.getLogger(__name__)
 
+# Сколько хранится прогресс пачки рассылки (на случай повторных попыток)
+NOTIFICATION_PROGRESS_TIMEOUT = 60 * 60 * 24
+
+
+def _digest_subscriptions(category_ids):
+    """
+    (user_id, username, email, [category_id, ...]) по подписчикам —
+    одним запросом к таблице подписок, сгруппировано по пользователю.
+    """
+    rows = (
+        Category.subscribers.through.objects
+        .filter(category_id__in=category_ids)
+        .exclude(user__email='')
+        .order_by('user_id', 'category_id')
+        .values_list('user_id', 'user__username', 'user__email', 'category_id')
+        .iterator(chunk_size=2000)
+    )
+    for (user_id, username, email), group in groupby(rows, key=lambda row: row[:3]):
+        yield user_id, username, email, [row[3] for row in group]
+
 
 @shared_task
-def weekly_digest():
+def weekly_digest(dry_run=False):
     """
     Раз в неделю шлём список новых новостей и статей за последние 7 дней.
+    В режиме dry_run ничего не отправляется, только считается объём рассылки.
     """
     logger.info("[weekly_digest] запуск задачи")
     week_ago = timezone.now() - timezone.timedelta(days=7)
+    return _send_digest(
+        Post.objects.filter(created_at__gte=week_ago),
+        subject='Новые публикации в {names} за неделю',
+        period='за последние 7 дней',
+        log_prefix='[weekly_digest]',
+        dry_run=dry_run,
+    )
+
+
+@shared_task
+def imported_posts_digest(post_ids):
+    """
+    Одно письмо на подписчика со всеми новостями его категорий из массового
+    импорта (import_posts) — вместо письма на каждую новость.
+    """
+    return _send_digest(
+        Post.objects.filter(pk__in=post_ids, post_type='news'),
+        subject='Новые публикации в {names}',
+        period='',
+        log_prefix='[imported_posts_digest]',
+    )
+
+
+def _send_digest(posts, subject, period, log_prefix, dry_run=False):
+    """
+    Рассылка списка постов подписчикам их категорий. Одно письмо на
+    пользователя со всеми его категориями; число запросов не зависит
+    от числа подписчиков.
+    """
+    # Посты и их категории — двумя запросами
+    posts = {post.id: post for post in posts.order_by('-created_at')}
+    # Порядок постов внутри категории берём из posts, а не из ORDER BY по join
+    # (он давал сортировку во временном B-дереве)
+    categories_by_post = defaultdict(list)
+    for category_id, post_id in (
+        PostCategory.objects.filter(post_id__in=list(posts)).order_by().values_list('category_id', 'post_id')
+    ):
+        categories_by_post[post_id].append(category_id)
+    posts_by_category = defaultdict(list)
+    for post_id, post in posts.items():
+        for category_id in categories_by_post[post_id]:
+            posts_by_category[category_id].append(post)
+
+    stats = {'dry_run': dry_run, 'posts': len(posts), 'categories': len(posts_by_category), 'emails': 0, 'failed': 0}
+    if not posts_by_category:
+        logger.info(f"{log_prefix} новых постов нет")
+        return stats
+
+    categories = Category.objects.in_bulk(list(posts_by_category))
+    for category_id, category_posts in posts_by_category.items():
+        logger.info(f"{log_prefix} сформировано {len(category_posts)} постов для категории {categories[category_id].name}")
 
     try:
         domain = Site.objects.get_current().domain
     except Site.DoesNotExist:
         domain = "example.com"  # Fallback domain
 
-    for category in Category.objects.all():
-        new_posts = Post.objects.filter(
-            created_at__gte=week_ago,
-            categories=category
-        )
+    batch_size = settings.DIGEST_SEND_BATCH
+    connection = None if dry_run else get_connection()
+    batch = []
 
-        if not new_posts.exists():
-            logger.info(f"[weekly_digest] в категории {category.name} новых постов нет")
-            continue
-
-        logger.info(f"[weekly_digest] сформировано {new_posts.count()} постов для категории {category.name}")
+    def flush():
+        try:
+            connection.send_messages(batch)
+            logger.info(f"{log_prefix} отправлено писем: {len(batch)}")
+        except Exception as e:
+            stats['failed'] += len(batch)
+            logger.error(f"{log_prefix} ошибка отправки пачки из {len(batch)} писем: {e}")
+        batch.clear()
 
-        for user in category.subscribers.all():
-            if not user.email:
+    try:
+        if connection is not None:
+            connection.open()
+        for user_id, username, email, category_ids in _digest_subscriptions(list(posts_by_category)):
+            stats['emails'] += 1
+            if dry_run:
                 continue
 
-            try:
-                html = render_to_string('portal/email/weekly_digest.html', {
-                    'user': user,
-                    'category': category,
-                    'posts': new_posts,
-                    'site_domain': domain,
-                })
+            sections = [(categories[category_id], posts_by_category[category_id]) for category_id in category_ids]
+            html = render_to_string('portal/email/weekly_digest.html', {
+                'username': username,
+                'sections': sections,
+                'site_domain': domain,
+                'period': period,
+            })
+            names = ', '.join(f'«{category.name}»' for category, _ in sections)
+            msg = EmailMultiAlternatives(
+                subject=subject.format(names=names),
+                body='У вас есть новые публикации — включите HTML-почту',
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[email],
+                connection=connection,
+            )
+            msg.attach_alternative(html, 'text/html')
+            batch.append(msg)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        if connection is not None:
+            connection.close()
 
-                msg = EmailMultiAlternatives(
-                    subject=f'Новые публикации в «{category.name}» за неделю',
-                    body='У вас есть новые публикации — включите HTML-почту',
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[user.email],
-                )
-                msg.attach_alternative(html, 'text/html')
-                msg.send()
-                logger.info(f"[weekly_digest] письмо отправлено {user.email}")
-            except Exception as e:
-                logger.error(f"[weekly_digest] ошибка отправки {user.email}: {e}")
+    if dry_run:
+        logger.info(f"{log_prefix} пробный запуск: {stats}")
+    else:
+        logger.info(f"{log_prefix} завершено: {stats}")
+    return stats
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=300)
+def translate_post(self, post_id):
+    """
+    Перевод опубликованного поста на английский (settings.TRANSLATE_ON_PUBLISH).
+    Не переведённое из-за ошибки сервиса повторяется позже.
+    """
+    translator.translate_posts(post_ids=[post_id])
+    if translator.untranslated_posts().filter(pk=post_id).exists():
+        raise self.retry()
+
+
+@shared_task
+def translate_missing_posts(limit=None):
+    """
+    Перевод всех постов без английской версии (догоняющий, пачками).
+    """
+    translated = translator.translate_posts(limit=limit)
+    logger.info(f"Переведено постов: {translated}")
+    return translated
+
+
+@shared_task
+def flush_vote_buffer():
+    """
+    Переносит буферизованные голоса (settings.VOTES_BUFFERED) в базу.
+    """
+    updated = flush_buffer()
+    if updated:
+        logger.info(f"Рейтинги обновлены для {updated} объектов")
 
 
 @shared_task
@@ -73,10 +198,30 @@ def delete_old_job_executions(max_age=604_800):
         logger.error(f"Ошибка при удалении старых задач: {e}")
 
 
+def _subscriber_ids(post):
+    """
+    id подписчиков категорий поста с почтой — потоком из базы, без загрузки User.
+    """
+    return (
+        User.objects.filter(subscribed_categories__post=post)
+        .exclude(email='')
+        .exclude(email=settings.DEFAULT_FROM_EMAIL)
+        .order_by('id')
+        .values_list('id', flat=True)
+        .distinct()
+        .iterator(chunk_size=settings.NOTIFICATION_CHUNK_SIZE)
+    )
+
+
+def _notification_progress_key(post_id, chunk_start):
+    return f'notify_progress:{post_id}:{chunk_start}'
+
+
 @shared_task
 def new_post_notification(post_id):
     """
     Асинхронная отправка писем подписчикам при создании новости.
+    Подписчики разбиваются на пачки, каждая пачка — отдельная задача.
     """
     try:
         post = Post.objects.get(pk=post_id)
@@ -84,46 +229,95 @@ def new_post_notification(post_id):
             logger.info(f"Пропуск отправки: пост {post_id} не является новостью")
             return
 
-        try:
-            domain = Site.objects.get_current().domain
-        except Site.DoesNotExist:
-            domain = "example.com"  # Fallback domain
+        chunks = 0
+        chunk = []
+        for user_id in _subscriber_ids(post):
+            chunk.append(user_id)
+            if len(chunk) >= settings.NOTIFICATION_CHUNK_SIZE:
+                send_post_notification_chunk.delay(post_id, chunk)
+                chunks += 1
+                chunk = []
+        if chunk:
+            send_post_notification_chunk.delay(post_id, chunk)
+            chunks += 1
 
-        subscribers = set()
-        for cat in post.categories.all():
-            subscribers.update(cat.subscribers.all())
-
-        if not subscribers:
+        if not chunks:
             logger.info(f"Для поста {post_id} нет подписчиков")
             return
+        logger.info(f"Для поста {post_id} запущено пачек рассылки: {chunks}")
 
-        for user in subscribers:
-            if not user.email or user.email == settings.DEFAULT_FROM_EMAIL:
-                continue
+    except Post.DoesNotExist:
+        logger.error(f"Пост {post_id} не найден")
+    except Exception as e:
+        logger.error(f"Ошибка в задаче отправки уведомлений: {e}")
 
-            try:
-                clean_domain = domain.replace('/ru', '').replace('/en', '')
 
+@shared_task(bind=True, max_retries=5, default_retry_delay=60)
+def send_post_notification_chunk(self, post_id, user_ids):
+    """
+    Отправка уведомлений одной пачке подписчиков через одно SMTP-соединение.
+    Письма уходят по одному, прогресс (id последнего получателя) хранится
+    в кэше, поэтому повторная попытка продолжает со следующего получателя.
+    После завершения — успешного или окончательно неудачного — прогресс удаляется.
+    """
+    if not user_ids:
+        return
+    progress_key = _notification_progress_key(post_id, user_ids[0])
+    try:
+        post = Post.objects.prefetch_related('categories').get(pk=post_id)
+    except Post.DoesNotExist:
+        cache.delete(progress_key)
+        logger.error(f"Пост {post_id} не найден")
+        return
+
+    last_sent_id = cache.get(progress_key, 0)
+    users = list(
+        User.objects.filter(id__in=[user_id for user_id in user_ids if user_id > last_sent_id])
+        .order_by('id')
+        .only('id', 'username', 'email')
+    )
+    if not users:
+        cache.delete(progress_key)
+        return
+
+    try:
+        domain = Site.objects.get_current().domain
+    except Site.DoesNotExist:
+        domain = "example.com"  # Fallback domain
+    clean_domain = domain.replace('/ru', '').replace('/en', '')
+    preview = post.content[:50] + '...'
+
+    batch_size = settings.NOTIFICATION_SEND_BATCH
+    sent = 0
+    try:
+        with get_connection() as connection:
+            for user in users:
                 html = render_to_string('portal/email/new_post_notification.html', {
                     'post': post,
                     'user': user,
-                    'preview': post.content[:50] + '...',
+                    'preview': preview,
                     'domain': clean_domain
                 })
-
                 msg = EmailMultiAlternatives(
                     subject=post.title,
-                    body=post.content[:50] + '...',
+                    body=preview,
                     from_email=settings.DEFAULT_FROM_EMAIL,
                     to=[user.email],
+                    connection=connection,
                 )
                 msg.attach_alternative(html, 'text/html')
-                msg.send()
-                logger.info(f"Уведомление отправлено {user.email} для поста {post_id}")
-            except Exception as e:
-                logger.error(f"Ошибка отправки {user.email}: {e}")
-
-    except Post.DoesNotExist:
-        logger.error(f"Пост {post_id} не найден")
+                connection.send_messages([msg])
+                sent += 1
+                last_sent_id = user.id
+                if sent % batch_size == 0:
+                    cache.set(progress_key, last_sent_id, NOTIFICATION_PROGRESS_TIMEOUT)
     except Exception as e:
-        logger.error(f"Ошибка в задаче отправки уведомлений: {e}")
\ No newline at end of file
+        logger.error(f"Ошибка отправки пачки уведомлений для поста {post_id} (отправлено {sent}): {e}")
+        if self.request.retries >= self.max_retries:
+            cache.delete(progress_key)
+            raise
+        cache.set(progress_key, last_sent_id, NOTIFICATION_PROGRESS_TIMEOUT)
+        raise self.retry(exc=e)
+
+    cache.delete(progress_key)
+    logger.info(f"Уведомления для поста {post_id} отправлены {sent} подписчикам")
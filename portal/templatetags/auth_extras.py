@@ -5,4 +5,9 @@ register = template.Library()
 
 @register.filter(name='has_group')
 def has_group(user, group_name):
-    return user.groups.filter(name=group_name).exists()
\ No newline at end of file
+    # Группы пользователя загружаются одним запросом на запрос, а не на каждую проверку в шаблоне
+    if not user.is_authenticated:
+        return False
+    if not hasattr(user, '_group_names'):
+        user._group_names = set(user.groups.values_list('name', flat=True))
+    return group_name in user._group_names
\ No newline at end of file
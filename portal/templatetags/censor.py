@@ -1,23 +1,19 @@
 from django import template
-import re
+from django.conf import settings
+from portal.censor import engine
 
 register = template.Library()
 
-# Список запрещённых слов. Например, "редиска".
-BANNED_WORDS = ['редиска']
+# Список запрещённых слов. Например, "редиска". Задаётся в settings.CENSOR_BANNED_WORDS.
+BANNED_WORDS = settings.CENSOR_BANNED_WORDS
 
 
 @register.filter(name='censor')
 def censor(value):
+    """
+    Для постов используйте сохранённые censored_title/censored_content —
+    фильтр нужен для произвольных строк.
+    """
     if not isinstance(value, str):
         raise ValueError("Фильтр censor применяется только к строковым переменным")
-
-    def repl(match):
-        word = match.group()
-        return word[0] + '*' * (len(word) - 1)
-
-    # Для каждого запрещённого слова создаём паттерн, учитывающий вариант с первой буквой в верхнем и в нижнем регистре.
-    for banned in BANNED_WORDS:
-        pattern = r'\b(?:' + re.escape(banned) + '|' + re.escape(banned.capitalize()) + r')\b'
-        value = re.sub(pattern, repl, value)
-    return value
\ No newline at end of file
+    return engine.censor(value)
@@ -0,0 +1,48 @@
+from functools import lru_cache
+
+import pytz
+from django import template
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from .auth_extras import has_group
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def _fragment(template_name, language, **flags):
+    """
+    Фрагмент базового шаблона, отрисованный один раз на процесс для языка
+    и набора флагов. Язык уже активен — он нужен только как часть ключа.
+    """
+    return render_to_string(template_name, {'timezones': pytz.common_timezones, **flags})
+
+
+@register.simple_tag(takes_context=True)
+def nav_links(context):
+    """
+    Ссылки навигации: у авторов — ещё и создание новостей и статей.
+    """
+    user = context.get('user')
+    is_author = bool(user and user.is_authenticated and has_group(user, 'authors'))
+    return mark_safe(_fragment('portal/layout/nav_links.html', get_language(), is_author=is_author))
+
+
+@register.simple_tag
+def timezone_options():
+    """
+    <option> всех часовых поясов (около 440) — из готового фрагмента,
+    выбранный пояс отмечается заменой строки.
+    """
+    options = _fragment('portal/layout/timezone_options.html', get_language())
+    option = f'<option value="{escape(timezone.get_current_timezone_name())}">'
+    return mark_safe(options.replace(option, option[:-1] + ' selected>', 1))
+
+
+@register.simple_tag
+def language_buttons():
+    return mark_safe(_fragment('portal/layout/language_buttons.html', get_language()))
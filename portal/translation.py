@@ -7,4 +7,4 @@ class CategoryTranslationOptions(TranslationOptions):
 
 @register(Post)
 class PostTranslationOptions(TranslationOptions):
-    fields = ('title', 'content')
\ No newline at end of file
+    fields = ('title', 'content', 'censored_title', 'censored_content')
\ No newline at end of file
@@ -0,0 +1,238 @@
+import hashlib
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .caching import bump_tags, post_tags
+from .censor import censored_field_values
+
+logger = logging.getLogger(__name__)
+
+# Переводимые поля поста: источник — язык по умолчанию, перевод — английский
+TRANSLATED_FIELDS = ('title', 'content')
+# Граница предложения: знак конца и пробелы после него (пробелы сохраняются при сборке)
+SENTENCE_RE = re.compile(r'(?<=[.!?…])(\s+)')
+
+
+def sentence_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def split_sentences(text):
+    """
+    [предложение, разделитель, предложение, ...] — нечётные элементы
+    хранят исходные пробелы, поэтому перевод собирается без потери абзацев.
+    """
+    return SENTENCE_RE.split(text or '')
+
+
+class BaseTranslationBackend:
+    """
+    Интерфейс бэкенда машинного перевода. translate_batch получает список
+    предложений и возвращает переводы в том же порядке; вызывается из потоков
+    пула, поэтому реализация должна быть потокобезопасной.
+    """
+
+    def translate_batch(self, sentences, source, target):
+        raise NotImplementedError
+
+
+class GoogleTranslateBackend(BaseTranslationBackend):
+    """
+    googletrans. Списков он не принимает, поэтому пачка уходит одним запросом —
+    предложения через перевод строки; если строк в ответе оказалось
+    не столько же, пачка переводится по одному предложению.
+    """
+
+    def __init__(self):
+        # У Translator свой httpx-клиент — по экземпляру на поток пула
+        self._local = threading.local()
+
+    def _translator(self):
+        translator = getattr(self._local, 'translator', None)
+        if translator is None:
+            from googletrans import Translator
+            translator = self._local.translator = Translator()
+        return translator
+
+    def translate_batch(self, sentences, source, target):
+        translator = self._translator()
+        if len(sentences) > 1 and not any('\n' in sentence for sentence in sentences):
+            lines = translator.translate('\n'.join(sentences), dest=target, src=source).text.split('\n')
+            if len(lines) == len(sentences):
+                return [line.strip() for line in lines]
+        return [translator.translate(sentence, dest=target, src=source).text for sentence in sentences]
+
+
+class OfflineBackend(BaseTranslationBackend):
+    """
+    Без сети: «перевод» — исходный текст с меткой языка. Для тестов и разработки.
+    """
+
+    def translate_batch(self, sentences, source, target):
+        return [f'[{target}] {sentence}' for sentence in sentences]
+
+
+_backend = None
+
+
+def get_backend():
+    """
+    Бэкенд из settings.TRANSLATION_BACKEND (один на процесс).
+    """
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.TRANSLATION_BACKEND)()
+    return _backend
+
+
+def translate_sentences(sentences, source, target, backend=None, batch_size=None, workers=None):
+    """
+    {предложение: перевод} для уникальных предложений. Известные берутся из
+    TranslationMemory одним запросом, остальные уходят в бэкенд пачками
+    по batch_size в пуле из workers потоков и сохраняются в память.
+    Предложения из упавших пачек в результат не попадают.
+    """
+    from .models import TranslationMemory
+
+    backend = backend or get_backend()
+    batch_size = batch_size or settings.TRANSLATION_BATCH_SIZE
+    workers = workers or settings.TRANSLATION_WORKERS
+
+    hashes = {sentence_hash(sentence): sentence for sentence in set(sentences)}
+    translated = {}
+    known = TranslationMemory.objects.filter(
+        source_language=source, target_language=target, source_hash__in=list(hashes),
+    ).values_list('source_hash', 'translated_text')
+    for digest, text in known.iterator(chunk_size=2000):
+        translated[hashes.pop(digest)] = text
+
+    pending = sorted(hashes.values())
+    if not pending:
+        return translated
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    def run(batch):
+        try:
+            return batch, backend.translate_batch(batch, source, target)
+        except Exception as e:
+            logger.error(f"Ошибка перевода пачки из {len(batch)} предложений: {e}")
+            return batch, None
+
+    memory = []
+    # Потоки только ходят в бэкенд; база — в этом потоке
+    with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+        for batch, result in pool.map(run, batches):
+            if result is None or len(result) != len(batch):
+                continue
+            for sentence, text in zip(batch, result):
+                translated[sentence] = text
+                memory.append(TranslationMemory(
+                    source_hash=sentence_hash(sentence),
+                    source_language=source,
+                    target_language=target,
+                    source_text=sentence,
+                    translated_text=text,
+                ))
+    TranslationMemory.objects.bulk_create(memory, batch_size=500, ignore_conflicts=True)
+    return translated
+
+
+def untranslated_posts():
+    """
+    Посты без английского заголовка или текста.
+    """
+    from .models import Post
+
+    missing = Q()
+    for field in TRANSLATED_FIELDS:
+        missing |= Q(**{f'{field}_en__isnull': True}) | Q(**{f'{field}_en': ''})
+    return Post.objects.filter(missing)
+
+
+def translate_posts(post_ids=None, limit=None, chunk_size=None, backend=None, workers=None, batch_size=None):
+    """
+    Переводит посты без перевода (или только post_ids из их числа) пачками
+    по chunk_size постов: предложения пачки переводятся вместе, посты
+    сохраняются bulk_update вместе с цензурированными полями и поисковым
+    индексом, теги кэша сдвигаются один раз на пачку. Пост, у которого не
+    перевелось хотя бы одно предложение поля, это поле не получает и
+    остаётся в выборке для следующего запуска. Возвращает число
+    переведённых постов.
+    """
+    from .models import Post
+    from .search import get_backend as get_search_backend
+
+    source = settings.MODELTRANSLATION_DEFAULT_LANGUAGE
+    target = 'en'
+    chunk_size = chunk_size or settings.TRANSLATION_CHUNK_SIZE
+    queryset = untranslated_posts().order_by('id')
+    if post_ids is not None:
+        queryset = queryset.filter(pk__in=post_ids)
+
+    fields = [f'{field}_{lang}' for field in TRANSLATED_FIELDS for lang in settings.MODELTRANSLATION_LANGUAGES]
+    update_fields = [
+        *(f'{field}_{target}' for field in TRANSLATED_FIELDS),
+        *(f'censored_{field}_{lang}' for field in TRANSLATED_FIELDS for lang in settings.MODELTRANSLATION_LANGUAGES),
+        'updated_at',
+    ]
+    search = get_search_backend()
+
+    done = 0
+    last_id = 0
+    while limit is None or done < limit:
+        # Ключевая пагинация по id: переведённые посты выпадают из выборки, смещение бы сбилось
+        size = chunk_size if limit is None else min(chunk_size, limit - done)
+        chunk = list(queryset.filter(pk__gt=last_id).only('id', 'post_type', 'author_id', *fields)[:size])
+        if not chunk:
+            break
+        last_id = chunk[-1].pk
+
+        parts = {}
+        for post in chunk:
+            for field in TRANSLATED_FIELDS:
+                text = getattr(post, f'{field}_{source}')
+                if text and text.strip() and not getattr(post, f'{field}_{target}'):
+                    parts[post.pk, field] = split_sentences(text)
+        sentences = [part for split in parts.values() for part in split[::2] if part.strip()]
+        translated = translate_sentences(sentences, source, target, backend=backend, workers=workers, batch_size=batch_size)
+
+        now = timezone.now()
+        changed = []
+        for post in chunk:
+            updated = False
+            for field in TRANSLATED_FIELDS:
+                split = parts.get((post.pk, field))
+                if split is None:
+                    continue
+                if not all(translated.get(part) for part in split[::2] if part.strip()):
+                    continue
+                text = ''.join(
+                    translated[part] if i % 2 == 0 and part.strip() else part
+                    for i, part in enumerate(split)
+                )
+                setattr(post, f'{field}_{target}', text)
+                updated = True
+            if updated:
+                for name, value in censored_field_values(post).items():
+                    setattr(post, name, value)
+                post.updated_at = now
+                changed.append(post)
+
+        # bulk_update не шлёт post_save — индекс и теги кэша обновляются здесь
+        Post.objects.bulk_update(changed, update_fields)
+        for post in changed:
+            try:
+                search.index_post(post)
+            except Exception as e:
+                logger.error(f"Ошибка обновления поискового индекса для поста {post.pk}: {e}")
+        bump_tags(*{tag for post in changed for tag in post_tags(post)})
+        done += len(changed)
+        logger.info(f"Переведено постов: {done}")
+    return done
@@ -1,10 +1,10 @@
-from django.http import HttpResponse
+from django.http import HttpResponse, Http404, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Post, Author, Category
-from django.core.paginator import Paginator
-from django.urls import reverse_lazy
+from .models import Post, Author, Category, Comment
+from django.urls import reverse, reverse_lazy
+from django.core.cache import cache
 from django.views.generic import CreateView, UpdateView, DeleteView
-from .forms import NewsForm, ArticleForm
+from .forms import NewsForm, ArticleForm, CommentForm
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from .filters import NewsFilter
 from django.contrib.auth.decorators import login_required, user_passes_test
@@ -12,19 +12,28 @@ from django.contrib.auth.models import Group
 from django.utils.decorators import method_decorator
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
+import hmac
 import logging
 from .mixins import EmailVerifiedRequiredMixin
-from django.views.decorators.cache import cache_page
-from django.views.decorators.http import require_GET
+from . import quota, ratelimit
+from .caching import cache_page_tagged, conditional_tagged
+from .cache_backends import render_stats as render_cache_stats
+from . import feeds
+from .metrics import registry as metrics_registry
+from .middlewares import get_timezone
+from .search import get_backend as get_search_backend
+from .showcase import SHOWCASE_TAG, localize_post, localize_posts, uses_showcase
+from django.views.decorators.http import require_GET, require_POST
 from django.utils.translation import gettext as _
 from django.utils.translation import gettext_lazy as _l
 from django.utils import translation
 from django.shortcuts import redirect
-import pytz
-from rest_framework import viewsets, permissions, status
+from rest_framework import generics, viewsets, permissions, status
 from rest_framework.response import Response
-from .serializers import PostSerializer
+from .serializers import CommentSerializer, PostSerializer, serialize_posts
+from .pagination import CommentPagination, KeysetPaginator, PostPagination, paginate_posts
 from django.utils import timezone
+from django.conf import settings
 
 
 logger = logging.getLogger(__name__)
@@ -33,43 +42,53 @@ logger = logging.getLogger('django')
 def authors_only(user):
     return user.groups.filter(name='authors').exists()
 
-# Временно отключаем кэширование для тестирования
-# @cache_page(60 * 5)
+@conditional_tagged(['posts:news', 'categories'])
+@cache_page_tagged(['posts:news', 'categories'])
 def news_list(request):
     # Активируем язык пользователя
     user_language = request.LANGUAGE_CODE
     translation.activate(user_language)
 
-    news = Post.objects.filter(post_type='news').order_by('-created_at')
+    news = (
+        Post.objects.filter(post_type='news')
+        .select_related('author__user')
+        .prefetch_related('categories')
+    )
 
+    page_obj = paginate_posts(request, news, 5, 'news')
     # Для первых 5 новостей принудительно используем переведенные версии
-    for news_item in news[:5]:
-        if user_language == 'en':
-            # Используем английскую версию, если она существует
-            news_item.title = news_item.title_en or news_item.title
-            news_item.content = news_item.content_en or news_item.content
+    localize_posts(page_obj.object_list, user_language)
 
-    paginator = Paginator(news, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Подписки пользователя — одним запросом, а не проверкой в шаблоне для каждой категории
+    subscribed_category_ids = set()
+    if request.user.is_authenticated:
+        subscribed_category_ids = set(request.user.subscribed_categories.values_list('id', flat=True))
 
     return render(request, 'portal/news_list.html', {
         'page_obj': page_obj,
+        'subscribed_category_ids': subscribed_category_ids,
         'page_title': _("News List")
     })
 
-# @cache_page(60 * 5)
+@conditional_tagged(['posts:article', 'categories'])
+@cache_page_tagged(['posts:article', 'categories'])
 def article_list(request):
-    articles = Post.objects.filter(post_type='article').order_by('-created_at')
-    paginator = Paginator(articles, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    articles = Post.objects.filter(post_type='article').select_related('author__user')
+    page_obj = paginate_posts(request, articles, 5, 'article')
     return render(request, 'portal/article_list.html', {
         'page_obj': page_obj,
         'page_title': _("Article List")
     })
 
-# @cache_page(60 * 5)
+def news_detail_tags(request, post_id):
+    tags = [f'post:{post_id}', 'categories']
+    # На английском страница зависит ещё и от состава витрины переводов
+    if uses_showcase():
+        tags.append(SHOWCASE_TAG)
+    return tags
+
+@conditional_tagged(news_detail_tags)
+@cache_page_tagged(news_detail_tags)
 def news_detail(request, post_id):
     post = get_object_or_404(Post, id=post_id)
 
@@ -78,18 +97,67 @@ def news_detail(request, post_id):
     translation.activate(user_language)
 
     # Если это одна из первых 5 новостей и язык английский
-    if user_language == 'en':
-        # Проверяем, входит ли новость в первые 5
-        first_five_ids = Post.objects.filter(post_type='news').order_by('-created_at').values_list('id', flat=True)[:5]
+    localize_post(post, user_language)
 
-        if post.id in first_five_ids:
-            # Используем английскую версию, если она существует
-            post.title = post.title_en or post.title
-            post.content = post.content_en or post.content
+    # Комментарии — страница по курсору, общее число из post.comment_count
+    comments = KeysetPaginator(
+        post.comment_set.select_related('user'), settings.COMMENTS_PAGE_SIZE, count=post.comment_count,
+    ).get_page(request.GET.get('comments_cursor'))
 
-    return render(request, 'portal/news_detail.html', {'post': post})
+    return render(request, 'portal/news_detail.html', {
+        'post': post,
+        'comments': comments,
+        'comment_form': CommentForm() if request.user.is_authenticated else None,
+    })
 
-# @cache_page(60)
+@login_required
+@require_POST
+def add_comment(request, post_id):
+    post = get_object_or_404(Post.objects.only('id', 'post_type'), pk=post_id)
+    form = CommentForm(request.POST)
+    if not form.is_valid():
+        messages.error(request, _("Comment cannot be empty"))
+    elif not ratelimit.comment_allowed(request.user):
+        messages.error(request, _("Too many comments, try again later"))
+    else:
+        form.instance.post = post
+        form.instance.user = request.user
+        form.save()
+        messages.success(request, _("Comment added"))
+    return redirect(reverse('news_detail', args=[post.pk]) + '#comments')
+
+def feed_view_tags(request, feed_format, post_type=None, category_id=None):
+    return feeds.feed_tags(post_type, category_id)
+
+@require_GET
+@conditional_tagged(feed_view_tags, personal=False)
+def feed(request, feed_format, post_type=None, category_id=None):
+    """
+    RSS / Atom / JSON Feed новостей, статей или категории на языке запроса.
+    Тело потоком из базы при первом запросе версии, дальше — из кэша.
+    """
+    if feed_format not in feeds.FEED_FORMATS:
+        raise Http404
+    content_type = feeds.FEED_FORMATS[feed_format]
+    key = feeds.feed_cache_key(request, feeds.feed_tags(post_type, category_id))
+    body = cache.get(key)
+    if body is not None:
+        return HttpResponse(body, content_type=content_type)
+
+    if category_id is not None:
+        category = get_object_or_404(Category, pk=category_id)
+        title, link = category.name, request.build_absolute_uri(reverse('news_list'))
+    elif post_type == Post.NEWS:
+        title, link = _("News List"), request.build_absolute_uri(reverse('news_list'))
+    else:
+        title, link = _("Article List"), request.build_absolute_uri(reverse('article_list'))
+    chunks = feeds.RENDERERS[feed_format](request, title, link, feeds.feed_posts(post_type, category_id))
+    return StreamingHttpResponse(
+        feeds.stream_feed(key, chunks, translation.get_language()),
+        content_type=content_type,
+    )
+
+@cache_page_tagged([], timeout=60)
 def home(request):
     lang_code = request.COOKIES.get('django_language')
     if lang_code:
@@ -97,9 +165,49 @@ def home(request):
     return render(request, 'portal/index.html', {'title': _('Home Page')})
 
 def search_news(request):
-    news = Post.objects.filter(post_type='news').order_by('-created_at')
+    news = Post.objects.filter(post_type='news').select_related('author__user')
     news_filter = NewsFilter(request.GET, queryset=news)
-    return render(request, 'portal/search.html', {'filter': news_filter, 'news': news_filter.qs})
+    form = news_filter.form
+    params = form.cleaned_data if form.is_valid() else {}
+
+    page_number = request.GET.get('page')
+    try:
+        page_number = max(int(page_number), 1)
+    except (TypeError, ValueError):
+        page_number = 1
+    per_page = settings.SEARCH_PAGE_SIZE
+    offset = (page_number - 1) * per_page
+
+    if params.get('title') or params.get('author'):
+        # Текстовый поиск — через индекс, с ранжированием
+        result = get_search_backend().search(
+            text=params.get('title') or '',
+            author=params.get('author') or '',
+            date_from=params.get('date'),
+            post_type='news',
+            offset=offset,
+            limit=per_page,
+        )
+        posts_by_id = news.in_bulk(result.ids)
+        results = [posts_by_id[post_id] for post_id in result.ids if post_id in posts_by_id]
+        total = result.total
+    else:
+        if params.get('date'):
+            news = news.filter(created_at__gte=params['date'])
+        total = news.count()
+        results = list(news.order_by('-created_at', '-id')[offset:offset + per_page])
+
+    query = request.GET.copy()
+    query.pop('page', None)
+    return render(request, 'portal/search.html', {
+        'filter': news_filter,
+        'news': results,
+        'total': total,
+        'page_number': page_number,
+        'previous_page': page_number - 1 if page_number > 1 else None,
+        'next_page': page_number + 1 if offset + per_page < total else None,
+        'query_string': query.urlencode(),
+    })
 
 class NewsCreateView(LoginRequiredMixin, EmailVerifiedRequiredMixin, CreateView):
     model = Post
@@ -237,47 +345,159 @@ def unsubscribe(request, category_id):
 def custom_permission_denied(request, exception):
     return render(request, '403.html', {'error_message': _("You don't have permission to perform this action")}, status=403)
 
+def metrics(request):
+    # Метрики (в т.ч. имена горячих ключей кэша) — только по токену; без METRICS_TOKEN адреса нет
+    token = settings.METRICS_TOKEN
+    if not token:
+        raise Http404
+    if not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        raise PermissionDenied
+    return HttpResponse(metrics_registry.render() + render_cache_stats(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def set_timezone(request):
+    response = redirect(request.META.get('HTTP_REFERER', '/'))
     if request.method == 'POST':
         tz = request.POST.get('timezone')
-        if tz:
-            request.session['django_timezone'] = tz
+        if tz and get_timezone(tz) is not None:
+            # Пояс хранится в cookie, а не в сессии: анонимным читателям сессия не нужна
+            response.set_cookie(
+                settings.TIMEZONE_COOKIE_NAME, tz,
+                max_age=settings.TIMEZONE_COOKIE_AGE,
+                samesite=settings.LANGUAGE_COOKIE_SAMESITE,
+            )
+            if request.user.is_authenticated:
+                # Пояс автора нужен и вне запроса — например, для лимита новостей в API
+                Author.objects.filter(user=request.user).update(timezone=tz)
             messages.success(request, _("Timezone changed to") + f" {tz}")
-    return redirect(request.META.get('HTTP_REFERER', '/'))
-
-
-class NewsViewSet(viewsets.ModelViewSet):
+    return response
+
+
+class PostReadMixin:
+    """
+    list/retrieve отдают строки из serialize_posts (values() + один запрос
+    за категориями; retrieve сначала ищет пост как get_object() — по id и
+    с проверкой прав); остальные действия работают через PostSerializer
+    с select_related/prefetch_related.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            return queryset
+        return queryset.select_related('author__user').prefetch_related('categories')
+
+    def list(self, request, *args, **kwargs):
+        # 304 по версии тега типа — до запросов к базе и сериализации
+        conditional = conditional_tagged([f'posts:{self.post_type}'], personal=False)
+        return conditional(self._list)(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        conditional = conditional_tagged([f'post:{kwargs[lookup_url_kwarg]}'], personal=False)
+        return conditional(self._retrieve)(request, *args, **kwargs)
+
+    def _list(self, request, *args, **kwargs):
+        # Пагинируется только (id, created_at), полные строки — одним запросом по id
+        queryset = self.filter_queryset(self.get_queryset()).only('id', 'created_at')
+        page = self.paginate_queryset(queryset)
+        posts = page if page is not None else queryset
+        ids = [post.pk for post in posts]
+        data = serialize_posts(Post.objects.filter(pk__in=ids), ids)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def _retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        # Как get_object(): нечисловой pk — 404, права на объект проверяются на лёгком экземпляре
+        post = generics.get_object_or_404(
+            self.filter_queryset(self.get_queryset()).only('id', 'author_id', 'post_type'),
+            **{self.lookup_field: kwargs[lookup_url_kwarg]},
+        )
+        self.check_object_permissions(request, post)
+        return Response(serialize_posts(Post.objects.filter(pk=post.pk))[0])
+
+
+class NewsViewSet(PostReadMixin, viewsets.ModelViewSet):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    queryset = Post.objects.filter(post_type='news').order_by('-created_at')
+    pagination_class = PostPagination
+    post_type = 'news'
+    queryset = Post.objects.filter(post_type='news').order_by('-created_at', '-id')
 
     def create(self, request, *args, **kwargs):
         # Проверка лимита новостей
-        today = timezone.localtime(timezone.now()).date()
         author = request.user.author
 
-        if Post.objects.filter(
-                author=author,
-                post_type='news',
-                created_at__date=today
-        ).count() >= 3:
+        if not quota.consume(author):
             return Response(
                 {"error": _("You cannot publish more than 3 news per day!")},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        return super().create(request, *args, **kwargs)
+        try:
+            return super().create(request, *args, **kwargs)
+        except Exception:
+            # Новость не создана (например, не прошла валидацию) — место в лимите возвращаем
+            quota.release(author)
+            raise
 
     def perform_create(self, serializer):
         author = self.request.user.author
         serializer.save(author=author, post_type='news')
 
 
-class ArticleViewSet(viewsets.ModelViewSet):
+class ArticleViewSet(PostReadMixin, viewsets.ModelViewSet):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    queryset = Post.objects.filter(post_type='article').order_by('-created_at')
+    pagination_class = PostPagination
+    post_type = 'article'
+    queryset = Post.objects.filter(post_type='article').order_by('-created_at', '-id')
 
     def perform_create(self, serializer):
         author = self.request.user.author
-        serializer.save(author=author, post_type='article')
\ No newline at end of file
+        serializer.save(author=author, post_type='article')
+
+
+class CommentListCreate(generics.ListCreateAPIView):
+    """
+    Комментарии поста: список по курсору (created_at, id) с общим числом
+    из Post.comment_count, создание — с ограничением частоты.
+    """
+    serializer_class = CommentSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CommentPagination
+
+    def get_post(self):
+        # Не свойство post: так называется обработчик POST-запроса
+        if not hasattr(self, '_post'):
+            self._post = get_object_or_404(Post.objects.only('id', 'post_type', 'comment_count'), pk=self.kwargs['post_id'])
+        return self._post
+
+    @property
+    def comment_total(self):
+        return self.get_post().comment_count
+
+    def get_queryset(self):
+        return Comment.objects.filter(post_id=self.get_post().pk).select_related('user')
+
+    def list(self, request, *args, **kwargs):
+        # Комментарии двигают тег поста — по нему и 304
+        conditional = conditional_tagged([f'post:{kwargs["post_id"]}'], personal=False)
+        return conditional(super().list)(request, *args, **kwargs)
+
+    def create(self, request, *args, **kwargs):
+        # Лимит — после проверки поста и данных: ошибочные запросы попыток не расходуют
+        self.get_post()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not ratelimit.comment_allowed(request.user):
+            return Response(
+                {"error": _("Too many comments, try again later")},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+        self.perform_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=self.get_success_headers(serializer.data))
+
+    def perform_create(self, serializer):
+        serializer.save(post=self.get_post(), user=self.request.user)
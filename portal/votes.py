@@ -0,0 +1,237 @@
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+BUFFER_PREFIX = 'vote_buffer'
+BUFFER_TIMEOUT = 60 * 60 * 24
+FLUSH_LOCK_TIMEOUT = 60
+# Сколько записей журнала разбирается за один запуск flush_buffer
+FLUSH_MAX_ENTRIES = 10000
+# Сколько ждать запись журнала под уже выданным номером (голос между incr и set);
+# дольше — процесс голоса упал, номер пропускается
+JOURNAL_GAP_GRACE = 60
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def _counter_key(label, pk):
+    return f'{BUFFER_PREFIX}:count:{label}:{pk}'
+
+
+def _dirty_key(seq):
+    return f'{BUFFER_PREFIX}:dirty:{seq}'
+
+
+def _gap_key(seq):
+    return f'{BUFFER_PREFIX}:gap:{seq}'
+
+
+def _incr(key, delta, timeout=BUFFER_TIMEOUT):
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Ключ вытеснили между add и incr
+        cache.set(key, delta, timeout)
+        return delta
+
+
+def apply_deltas(model, deltas):
+    """
+    Атомарно прибавляет к rating значения {pk: delta} одним UPDATE,
+    без save() и post_save (не переписываются content_* и не срабатывают
+    инвалидация кэша и логирование). В той же транзакции обновляются
+    рейтинги затронутых авторов.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        model.objects.filter(pk__in=list(deltas)).update(rating=F('rating') + _case_increment(deltas))
+        _apply_author_deltas(_author_deltas(model, deltas))
+
+
+def _case_increment(deltas):
+    if len(deltas) == 1:
+        return Value(next(iter(deltas.values())))
+    return Case(
+        *(When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _author_deltas(model, deltas):
+    """
+    Изменение рейтинга авторов по формуле Author.update_rating:
+    рейтинг поста x3, рейтинг комментария — его автору и автору поста.
+    """
+    Post = apps.get_model('portal', 'Post')
+    Comment = apps.get_model('portal', 'Comment')
+
+    author_deltas = defaultdict(int)
+    if model is Post:
+        for pk, author_id in Post.objects.filter(pk__in=list(deltas)).values_list('pk', 'author_id'):
+            author_deltas[author_id] += 3 * deltas[pk]
+    elif model is Comment:
+        rows = Comment.objects.filter(pk__in=list(deltas)).values_list('pk', 'user__author', 'post__author_id')
+        for pk, comment_author_id, post_author_id in rows:
+            # Комментатор может и не быть автором
+            if comment_author_id is not None:
+                author_deltas[comment_author_id] += deltas[pk]
+            author_deltas[post_author_id] += deltas[pk]
+    return {pk: delta for pk, delta in author_deltas.items() if delta}
+
+
+def _apply_author_deltas(deltas):
+    if deltas:
+        Author = apps.get_model('portal', 'Author')
+        Author.objects.filter(pk__in=list(deltas)).update(rating=F('rating') + _case_increment(deltas))
+
+
+def withdraw(model, queryset):
+    """
+    Снимает с рейтингов авторов вклад постов или комментариев queryset.
+    Вызывается до массового удаления или обнуления рейтинга, которые
+    идут мимо сигналов; строки с нулевым рейтингом не читаются.
+    """
+    deltas = {pk: -rating for pk, rating in queryset.exclude(rating=0).values_list('pk', 'rating')}
+    if deltas:
+        _apply_author_deltas(_author_deltas(model, deltas))
+
+
+def withdraw_deleted(instance):
+    """
+    То же для уже удалённого поста или комментария (post_delete): строки
+    в базе нет, вклад считается по полям instance.
+    """
+    if not instance.rating:
+        return
+    Post = apps.get_model('portal', 'Post')
+    Author = apps.get_model('portal', 'Author')
+
+    author_deltas = defaultdict(int)
+    if isinstance(instance, Post):
+        author_deltas[instance.author_id] -= 3 * instance.rating
+    else:
+        # При каскадном удалении поста комментарии удаляются раньше него — автор поста ещё в базе
+        post_author_id = Post.objects.filter(pk=instance.post_id).values_list('author_id', flat=True).first()
+        comment_author_id = Author.objects.filter(user_id=instance.user_id).values_list('pk', flat=True).first()
+        for author_id in (post_author_id, comment_author_id):
+            if author_id is not None:
+                author_deltas[author_id] -= instance.rating
+    _apply_author_deltas({pk: delta for pk, delta in author_deltas.items() if delta})
+
+
+def author_ratings():
+    """
+    Рейтинги всех авторов с нуля: {author_id: rating}. Три сгруппированных
+    запроса вместо трёх агрегатов на каждого автора.
+    """
+    Post = apps.get_model('portal', 'Post')
+    Comment = apps.get_model('portal', 'Comment')
+
+    ratings = defaultdict(int)
+    for author_id, total in Post.objects.values_list('author_id').annotate(total=Sum('rating')).order_by():
+        ratings[author_id] += 3 * (total or 0)
+    for author_id, total in (
+        Comment.objects.filter(user__author__isnull=False)
+        .values_list('user__author').annotate(total=Sum('rating')).order_by()
+    ):
+        ratings[author_id] += total or 0
+    for author_id, total in Comment.objects.values_list('post__author_id').annotate(total=Sum('rating')).order_by():
+        ratings[author_id] += total or 0
+    return ratings
+
+
+def vote(instance, delta):
+    """
+    Голос за пост или комментарий. В обычном режиме — сразу атомарный
+    UPDATE; при settings.VOTES_BUFFERED — инкремент в кэше, который
+    позже переносит в базу flush_buffer() (задача flush_vote_buffer).
+    """
+    if getattr(settings, 'VOTES_BUFFERED', False):
+        label = _label(type(instance))
+        _incr(_counter_key(label, instance.pk), delta)
+        # Журнал «грязных» объектов: порядковый номер -> (модель, pk).
+        # Номер виден flush_buffer раньше записи — он дождётся её (_journal_end)
+        seq = _incr(f'{BUFFER_PREFIX}:seq', 1, timeout=None)
+        cache.set(_dirty_key(seq), (label, instance.pk), BUFFER_TIMEOUT)
+    else:
+        apply_deltas(type(instance), {instance.pk: delta})
+    # Значение в памяти — для вызывающего кода; в базе оно может быть другим
+    instance.rating += delta
+
+
+def flush_buffer():
+    """
+    Переносит накопленные в кэше голоса в базу: по одному UPDATE на модель.
+    Возвращает число обновлённых объектов.
+    """
+    lock_key = f'{BUFFER_PREFIX}:lock'
+    if not cache.add(lock_key, 1, FLUSH_LOCK_TIMEOUT):
+        return 0
+    try:
+        flushed_seq = cache.get(f'{BUFFER_PREFIX}:flushed', 0)
+        upper = min(cache.get(f'{BUFFER_PREFIX}:seq', 0), flushed_seq + FLUSH_MAX_ENTRIES)
+        if upper <= flushed_seq:
+            return 0
+
+        entries = cache.get_many([_dirty_key(seq) for seq in range(flushed_seq + 1, upper + 1)])
+        last_seq = _journal_end(entries, flushed_seq, upper)
+        if last_seq <= flushed_seq:
+            return 0
+        dirty_keys = [_dirty_key(seq) for seq in range(flushed_seq + 1, last_seq + 1)]
+        objects = {entries[key] for key in dirty_keys if key in entries}
+
+        by_model = defaultdict(dict)
+        for label, pk in objects:
+            key = _counter_key(label, pk)
+            delta = cache.get(key, 0)
+            if delta:
+                # decr на прочитанное значение не теряет голоса, пришедшие между get и decr
+                cache.decr(key, delta)
+                by_model[label][pk] = delta
+
+        try:
+            for label in list(by_model):
+                apply_deltas(apps.get_model(label), by_model[label])
+                del by_model[label]
+        except Exception:
+            # Не записанные в базу голоса возвращаем в буфер до следующего запуска
+            for label, deltas in by_model.items():
+                for pk, delta in deltas.items():
+                    _incr(_counter_key(label, pk), delta)
+            raise
+
+        cache.delete_many(dirty_keys)
+        cache.set(f'{BUFFER_PREFIX}:flushed', last_seq, None)
+        return len(objects)
+    finally:
+        cache.delete(lock_key)
+
+
+def _journal_end(entries, flushed_seq, upper):
+    """
+    Последний номер журнала, до которого его можно разобрать. Номер без
+    записи обычно значит, что голос ещё между incr и set: разбор
+    останавливается перед ним, иначе flushed ушёл бы дальше и запись,
+    появившаяся позже, не была бы прочитана никогда. Запись, которой нет
+    дольше JOURNAL_GAP_GRACE секунд, уже не появится — номер пропускается.
+    """
+    last_seq = flushed_seq
+    for seq in range(flushed_seq + 1, upper + 1):
+        if _dirty_key(seq) not in entries:
+            first_seen = cache.get_or_set(_gap_key(seq), time.time(), BUFFER_TIMEOUT)
+            if time.time() - first_seen < JOURNAL_GAP_GRACE:
+                break
+            cache.delete(_gap_key(seq))
+        last_seq = seq
+    return last_seq